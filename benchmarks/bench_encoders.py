@@ -0,0 +1,58 @@
+#Benchmarks DecimalEncoderMultiNet._encodeOne against the insertion encoding it replaced
+#Run from the repository root with python -m benchmarks.bench_encoders
+
+import time
+from midi_parser.midi_parser import MidiParser, DurationalNote, logger
+from midi_parser.decimal_encoders import DecimalEncoderMultiNet
+
+
+SERIALIZED = "test/test_data/serialized_durational"
+REPEATS = 5
+#Notes in the dense time unit, where inserting into the middle of the list is quadratic
+CHORD_SIZE = 5000
+
+
+
+#_encodeOne before it was a grouped sort, kept here as the baseline
+def encodeInsert(events):
+    encoded = []
+    for i,note in enumerate(events):
+        if(i>0 and note[0]==300 and encoded[-1][0]==300):
+            encoded[-1][1]+=note[1]
+            continue
+        searchInd = 0
+        lastInd = len(encoded)-1
+        while(lastInd-searchInd>=0 and note[0] < encoded[lastInd-searchInd][0] and encoded[lastInd-searchInd][0]!=300):
+            searchInd += 1
+        if(lastInd-searchInd>=0 and note[0] == encoded[lastInd-searchInd][0]):
+            continue
+        encoded.insert(lastInd+1 - searchInd, note)
+    return encoded
+
+
+def best(fn):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+#One time unit of notes with falling, mostly distinct pitches so each note is inserted at the front
+def denseChord():
+    return [DurationalNote._make("note_on", 1, CHORD_SIZE - i, 0, 100) for i in range(CHORD_SIZE)] + [DurationalNote._make("time_unit", 1, None, 0, None)]
+
+
+def bench(name, encoder):
+    before = best(lambda: [encodeInsert(encoder._encodeEvents(piece)) for piece in encoder.parsedMidis])
+    after = best(lambda: [encoder._encodeOne(piece) for piece in encoder.parsedMidis])
+    nEvents = sum(len(piece) for piece in encoder.parsedMidis)
+    print("{:<22}{:>10,}{:>14.4f}{:>14.4f}".format(name, nEvents, before, after))
+
+
+if __name__ == "__main__":
+    logger.handlers[0].setLevel("ERROR")
+    print("{:<22}{:>10}{:>14}{:>14}".format("", "events", "before (s)", "after (s)"))
+    bench("serialized_durational", DecimalEncoderMultiNet(MidiParser.deSerialize(SERIALIZED), 100))
+    bench("dense chord", DecimalEncoderMultiNet([denseChord()], 100))
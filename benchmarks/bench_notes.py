@@ -0,0 +1,110 @@
+#Benchmarks memory and speed of the Note hierarchy against the old notes that had a __dict__
+#Run from the repository root with python -m benchmarks.bench_notes
+
+import time
+import tracemalloc
+from midi_parser.midi_parser import parseToMidos, findMidis, AbsoluteNote, OneTrack, logger
+
+
+FOLDER = "test/test_data/midis"
+REPEATS = 5
+
+
+
+#Note hierarchy before __slots__, kept here as the baseline
+class DictNote:
+    def __init__(self, type, time, pitch = None, instrument = None, velocity = None):
+        if(velocity==0 and type=="note_on"):
+            type = "note_off"
+        self.type = type
+        self.pitch = self._noneify(pitch)
+        self.time = self._noneify(time)
+        self.velocity = self._noneify(velocity)
+        self.instrument = self._noneify(instrument)
+
+    def convertToRelative(self, time):
+        return DictRelativeNote(self.type, time, pitch = self.pitch, instrument = self.instrument, velocity = self.velocity)
+
+    def convertToDurational(self, time):
+        return DictDurationalNote(self.type, time, pitch = self.pitch, instrument = self.instrument, velocity = self.velocity)
+
+    def _noneify(self, var):
+        if(var!=None):
+            return var
+        return None
+
+class DictAbsoluteNote(DictNote):
+    def __init__(self, type, time, pitch = None, instrument = None, velocity = None):
+        super().__init__(type = type, time = time, pitch = pitch, instrument = instrument, velocity = velocity)
+
+class DictRelativeNote(DictNote):
+    def __init__(self, type, time, pitch = None, instrument = None, velocity = None):
+        super().__init__(type = type, time = time, pitch = pitch, instrument = instrument, velocity = velocity)
+
+class DictDurationalNote(DictNote):
+    def __init__(self, type, time, pitch = None, instrument = None, velocity = None):
+        super().__init__(type, time, pitch = pitch, instrument = instrument, velocity = velocity)
+
+
+
+#(<type>, <absolute time>, <pitch>, <channel>, <velocity>) of every note message in the corpus
+def loadEvents():
+    events = []
+    for mido in parseToMidos(findMidis(FOLDER)):
+        for track in mido.tracks:
+            absoluteTime = 0
+            for msg in track:
+                absoluteTime += msg.time
+                if(msg.type in ["note_on", "note_off"]):
+                    events.append((msg.type, absoluteTime, msg.note, msg.channel, msg.velocity))
+    return events
+
+
+def buildOld(events):
+    absolute = [DictAbsoluteNote(_type, t, pitch, instrument = channel, velocity = velocity) for _type, t, pitch, channel, velocity in events]
+    return [note.convertToRelative(note.time) for note in absolute], [note.convertToDurational(note.time) for note in absolute]
+
+def buildNew(events):
+    absolute = [AbsoluteNote._make("note_off" if velocity == 0 else _type, t, pitch, channel, velocity) for _type, t, pitch, channel, velocity in events]
+    return [note.convertToRelative(note.time) for note in absolute], [note.convertToDurational(note.time) for note in absolute]
+
+
+def bytesPerNote(build, events):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    notes = build(events)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    nNotes = sum(len(track) for track in notes)
+    return (after - before)/nNotes
+
+
+def notesPerSecond(build, events):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        notes = build(events)
+        best = min(best, time.perf_counter() - start)
+    return 3*len(events)/best
+
+
+def oneTrackNotesPerSecond(timeMeasurement):
+    midos = parseToMidos(findMidis(FOLDER))
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        ots = [OneTrack(mido, (46,84), 1/32, True, timeMeasurement) for mido in midos]
+        nNotes = sum(len(ot.track) for ot in ots if ot.valid)
+        best = min(best, time.perf_counter() - start)
+    return nNotes/best
+
+
+if __name__ == "__main__":
+    logger.handlers[0].setLevel("ERROR")
+    events = loadEvents()
+    print("{} note events from {}".format(len(events), FOLDER))
+    print("{:<10}{:>16}{:>16}".format("", "bytes/note", "notes/sec"))
+    for name, build in [("before", buildOld), ("after", buildNew)]:
+        print("{:<10}{:>16.1f}{:>16,.0f}".format(name, bytesPerNote(build, events), notesPerSecond(build, events)))
+    for timeMeasurement in ["relative", "durational"]:
+        print("OneTrack {} notes/sec: {:,.0f}".format(timeMeasurement, oneTrackNotesPerSecond(timeMeasurement)))
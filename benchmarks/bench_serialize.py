@@ -0,0 +1,56 @@
+#Benchmarks writing and loading parsed midis with pickle against the binary format of writeParsed
+#Run from the repository root with python -m benchmarks.bench_serialize
+
+import copy
+import os
+import pickle
+import tempfile
+import time
+from midi_parser.midi_parser import MidiParser, writeParsed, readParsed, logger
+
+
+FOLDER = "test/test_data/midis"
+#The test corpus is small so it is copied to get a corpus worth timing. Copies are deep so pickle can not memoize them
+COPIES = 20
+REPEATS = 5
+
+
+
+def best(fn):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def writePickle(parsed, fp):
+    with open(fp, "wb") as f:
+        pickle.dump(parsed, f)
+
+def readPickle(fp):
+    with open(fp, "rb") as f:
+        return pickle.load(f)
+
+
+def bench(parsed, folder):
+    pickleFp = os.path.join(folder, "parsed.pkl")
+    binaryFp = os.path.join(folder, "parsed.npz")
+    rows = [
+        ("pickle", best(lambda: writePickle(parsed, pickleFp)), best(lambda: readPickle(pickleFp)), os.path.getsize(pickleFp)),
+        ("binary", best(lambda: writeParsed(parsed, binaryFp)), best(lambda: readParsed(binaryFp)), os.path.getsize(binaryFp))
+    ]
+    for name, write, load, size in rows:
+        print("{:<10}{:>12.4f}{:>12.4f}{:>14,}".format(name, write, load, size))
+
+
+if __name__ == "__main__":
+    logger.handlers[0].setLevel("ERROR")
+    with tempfile.TemporaryDirectory() as folder:
+        for timeMeasurement, columnar in [("relative", False), ("durational", False), ("relative", True)]:
+            parsed = MidiParser((46,84), 1/32, True, timeMeasurement, folder = FOLDER, columnar = columnar).parse()
+            parsed = [copy.deepcopy(piece) for _ in range(COPIES) for piece in parsed]
+            print("\n{} {}, {} pieces, {} notes".format(timeMeasurement, "NoteArrays" if columnar else "notes", len(parsed), sum(len(piece) for piece in parsed)))
+            print("{:<10}{:>12}{:>12}{:>14}".format("", "write (s)", "load (s)", "bytes"))
+            bench(parsed, folder)
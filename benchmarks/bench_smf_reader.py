@@ -0,0 +1,34 @@
+#Benchmarks reading midis with readMidiNotes against mido
+#Run from the repository root with python -m benchmarks.bench_smf_reader
+
+import time
+from midi_parser.midi_parser import MidiParser, findMidis, parseToMidos, logger
+
+
+FOLDER = "test/test_data/midis"
+REPEATS = 5
+
+
+
+def best(fn):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench(name, fn):
+    before = best(lambda: fn(False))
+    after = best(lambda: fn(True))
+    print("{:<22}{:>14.4f}{:>14.4f}".format(name, before, after))
+
+
+if __name__ == "__main__":
+    logger.handlers[0].setLevel("ERROR")
+    paths = findMidis(FOLDER)
+    print("{:<22}{:>14}{:>14}".format("", "mido (s)", "fast (s)"))
+    bench("read", lambda fast: parseToMidos(paths, fast = fast))
+    bench("parse relative", lambda fast: MidiParser((46,84), 1/32, True, "relative", folder = FOLDER, fastReader = fast).parse())
+    bench("parse columnar", lambda fast: MidiParser((46,84), 1/32, True, "relative", folder = FOLDER, columnar = True, fastReader = fast).parse())
@@ -1,28 +1,31 @@
 #Keras data generator classes for each type of neural network
 
 
-from numpy.core.fromnumeric import sort
 from sklearn.base import ClassifierMixin
 from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, MultiLabelBinarizer
 
 import keras
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
 from .pieces import MultiNetPiece
-import itertools
+from .encoded_corpus import EncodedCorpus
+from .decimal_encoders import DecimalEncoderMiniBachStyle
 import copy
 from itertools import chain
+from collections import Counter
 
 
 
 class DataGen(keras.utils.Sequence):
-    def __init__(self, encodedMidis, batchSize, lookback, gap):
+    def __init__(self, encodedMidis, batchSize, lookback, gap, sparse = False):
         """
         Abstraction for data generators
 
         Parameters
         ----------
-        encodedMidis: list[list]
-            List of encoded pieces
+        encodedMidis: list[list], EncodedCorpus or str
+            List of encoded pieces, an EncodedCorpus or the folder of a saved EncodedCorpus, which
+            is opened memory mapped
         ranges: dict[list]
             Includes the ranges for notes
         batchSize: int
@@ -33,45 +36,134 @@ class DataGen(keras.utils.Sequence):
             Interval at which new samples are generated in a piece
         dimensions: list
             List of the different number of classes for each category
+        sparse: bool
+            If classes are given as integer indices instead of one hot, for sparse categorical
+            losses and embeddings
         """
-        self.encodedMidis = encodedMidis
+        self.encodedMidis = self._toCorpus(encodedMidis)
         self.ranges = self.getRanges()
         self.batchSize = batchSize
         self.lookback = lookback
         self.gap = gap
+        self.sparse = sparse
+        self.random = None
         self.indices = self.getIndices()
         self.shuffleInds()
         self.updateEncoders()
 
+    #Pieces are converted to one array once so batches can be gathered from it
+    def _toCorpus(self, encodedMidis):
+        if(isinstance(encodedMidis, str)):
+            return EncodedCorpus.open(encodedMidis)
+        if(isinstance(encodedMidis, EncodedCorpus)):
+            return encodedMidis
+        return EncodedCorpus.fromEncoded(encodedMidis)
+
+    #Ranges come from the vocabulary of the corpus, which also gives how often each class occurs in frequencies
     def getRanges(self):
-        if(type(self.encodedMidis[0][0])!=list):
-            print([list(set(itertools.chain.from_iterable(self.encodedMidis)))])
-            return [list(set(itertools.chain.from_iterable(self.encodedMidis)))]
-        ranges = []
-        for i in range(len(self.encodedMidis[0][0])):
-            currentRange = sort(list(set(np.array(list(itertools.chain.from_iterable(self.encodedMidis)))[:,i])))
-            ranges.append(currentRange)
-        return ranges
+        vocabulary = self.encodedMidis.getVocabulary()
+        self.frequencies = vocabulary.counts
+        if(self.encodedMidis.tokens.ndim == 1):
+            return [vocabulary.values[0].tolist()]
+        return vocabulary.values
 
 
 
-    def validationSplit(self, test_size):
-        print(np.array(self.encodedMidis))
-        nTestSamples = int(test_size*len(self.encodedMidis))
-        self.shuffleInds()
-        testSamples, self.encodedMidis = self.encodedMidis[:nTestSamples], self.encodedMidis[nTestSamples:]
-        self.indices = self.getIndices()
-        validationDatagen = copy.deepcopy(self)
-        validationDatagen.encodedMidis = testSamples
+    def validationSplit(self, test_size, seed = None):
+        """
+        Splits off pieces for validation. The validation generator shares the encoded pieces,
+        ranges and encoders of this one, so only the sample indices are new
+
+        Parameters
+        ----------
+        test_size: float
+            Fraction of pieces used for validation
+        seed: int
+            Seed of the random choice of validation pieces. If None the first pieces are used
+
+        Returns: DataGen of the validation pieces
+        """
+        nTestPieces = int(test_size*len(self.encodedMidis))
+        if(seed == None):
+            order = np.arange(len(self.encodedMidis))
+        else:
+            order = np.random.RandomState(seed).permutation(len(self.encodedMidis))
+        validationDatagen = copy.copy(self)
+        validationDatagen.encodedMidis = self._getPieces(np.sort(order[:nTestPieces]))
         validationDatagen.indices = validationDatagen.getIndices()
+        self.encodedMidis = self._getPieces(np.sort(order[nTestPieces:]))
+        self.indices = self.getIndices()
+        self.shuffleInds()
         return validationDatagen
 
+    def _getPieces(self, pieceInds):
+        if(isinstance(self.encodedMidis, EncodedCorpus)):
+            return self.encodedMidis[pieceInds]
+        return [self.encodedMidis[i] for i in pieceInds]
+
 
     def updateEncoders(self):
         raise NotImplementedError("Must include updateEncoders()")
 
+    #Lookup table per dimension from token - <smallest token> to its index in ranges, so batches are encoded by indexing instead of refitting sklearn encoders
+    def _updateLookups(self):
+        self.lookups = []
+        for currentRange in self.ranges:
+            currentRange = np.asarray(currentRange)
+            minimum = currentRange.min()
+            lookup = np.full(currentRange.max() - minimum + 1, -1, dtype = np.int32)
+            lookup[currentRange - minimum] = np.arange(len(currentRange))
+            self.lookups.append((minimum, lookup))
+
+    #Fits a sklearn encoder on the ranges once so it can still be used to decode
+    def _fitEncoder(self, encoder):
+        nRows = max(len(currentRange) for currentRange in self.ranges)
+        return encoder.fit(np.stack([np.resize(currentRange, nRows) for currentRange in self.ranges], axis = 1))
+
+    #Index of every token in ranges. Samples have a last axis of dimensions unless tokens are single numbers
+    def _ordinalIndices(self, samples):
+        samples = np.asarray(samples)
+        columns = [samples] if self.encodedMidis.tokens.ndim == 1 else [samples[...,i] for i in range(samples.shape[-1])]
+        indices = []
+        for i, (column, (minimum, lookup)) in enumerate(zip(columns, self.lookups)):
+            shifted = column - minimum
+            known = (shifted >= 0) & (shifted < len(lookup))
+            index = lookup[np.where(known, shifted, 0)]
+            known &= index >= 0
+            if(not known.all()):
+                raise ValueError("Found unknown categories {} in column {} during transform".format(np.unique(column[~known]).tolist(), i))
+            indices.append(index)
+        return indices
+
+    #Integer index of every token in ranges, used when sparse
+    def _sparse(self, samples):
+        indices = self._ordinalIndices(samples)
+        if(self.encodedMidis.tokens.ndim == 1):
+            return indices[0]
+        return np.stack(indices, axis = -1)
+
+    #Same output as OrdinalEncoder.transform on each sample
+    def _ordinal(self, samples):
+        return self._sparse(samples).astype(np.float64)
+
+    #Same output as OneHotEncoder(sparse=False).transform on each sample
+    def _oneHot(self, samples):
+        indices = self._ordinalIndices(samples)
+        return np.concatenate([np.eye(len(currentRange))[index] for currentRange, index in zip(self.ranges, indices)], axis = -1)
+
     def __getitem__(self, index):
-        xIndices, yIndices = self._getXYIndexStarts(index)
+        return self.getBatch(self._getBatchIndices(index))
+
+    def getBatch(self, xIndices):
+        """
+        Parameters
+        ----------
+        xIndices: array
+            Ids of the samples in the batch, as given by _getBatchIndices
+
+        Returns: encoded batch of the samples
+        """
+        xIndices, yIndices = self._getXYIndexStarts(xIndices)
         xEncodedSamples, yEncodedSamples = self._getXYEncodedSamples(xIndices,yIndices)
         return self._encodeBatch(xEncodedSamples, yEncodedSamples)
 
@@ -81,33 +173,43 @@ class DataGen(keras.utils.Sequence):
 
 
 
-    #Gets x and y indices starting point in form of (<piece Ind>, <sample Ind>) based on batchsize
-    def _getXYIndexStarts(self, index):
-        xIndices = self.indices[index*self.batchSize:(index+1)*self.batchSize]
-        yIndices = [(xInd[0], xInd[1]+self.lookback) for xInd in xIndices]
-        return xIndices,yIndices
+    #Gets sample ids of a batch based on batchsize. Copied so shuffling does not change a batch being built
+    def _getBatchIndices(self, index):
+        return self.indices[index*self.batchSize:(index+1)*self.batchSize].copy()
+
+    #Gets x and y indices starting point in form of (<piece inds>, <sample inds>)
+    def _getXYIndexStarts(self, xIndices):
+        pieceInds, sampleInds = self._getSampleStarts(xIndices)
+        return (pieceInds, sampleInds), (pieceInds, sampleInds+self.lookback)
 
     def _getXYEncodedSamples(self, xIndices, yIndices):
-        xEncodedSamples = [np.array(self.encodedMidis[xStartInd[0]])[xStartInd[1]:xStartInd[1]+self.lookback] for xStartInd in np.array(xIndices)]
-        yEncodedSamples = [self.encodedMidis[yInd[0]][yInd[1]] for yInd in np.array(yIndices)]
-        return np.stack(xEncodedSamples), np.stack(yEncodedSamples)
+        xStarts = self.encodedMidis.positions(*xIndices)
+        yStarts = self.encodedMidis.positions(*yIndices)
+        return self.encodedMidis.windows(xStarts, self.lookback), self.encodedMidis.tokens[yStarts]
 
-    #Grabs every possible sample starting place as list of (<piece ind>, <sample ind>)
+    #Grabs the id of every possible sample. Sample i of piece p has id pieceSampleStarts[p] + i
     def getIndices(self):
-        indicesByPiece = [self._getIndicesByPiece(piece) for piece in self.encodedMidis]
-        indicesByPieceAndSample = [self._getIndicesByPieceAndSample(indicesByPiece[i], i) for i in range(len(indicesByPiece))]
-        return list(itertools.chain.from_iterable(indicesByPieceAndSample))
-
-    #Grabs every sample ind in a single piece
-    def _getIndicesByPiece(self, piece):
-        pieceLength = len(piece)
-        return [i for i in range(pieceLength) if i%self.gap == 0 and (i+1)< pieceLength-self.lookback]
-    
-    def _getIndicesByPieceAndSample(self, indices, pieceInd):
-        return [(pieceInd, i) for i in indices]
+        nSamples = self._getNSamplesByPiece(self._getPieceLengths())
+        self.pieceSampleStarts = np.cumsum(nSamples) - nSamples
+        return np.arange(nSamples.sum(), dtype = np.int64)
+
+    def _getPieceLengths(self):
+        if(isinstance(self.encodedMidis, EncodedCorpus)):
+            return self.encodedMidis.lengths
+        return np.array([len(piece) for piece in self.encodedMidis], dtype = np.int64)
+
+    #Samples start every gap notes and need lookback notes and the next note after them
+    def _getNSamplesByPiece(self, pieceLengths):
+        nStarts = np.maximum(pieceLengths - self.lookback - 1, 0)
+        return (nStarts + self.gap - 1)//self.gap
+
+    #Maps sample ids to (<piece inds>, <sample inds>)
+    def _getSampleStarts(self, sampleIds):
+        pieceInds = np.searchsorted(self.pieceSampleStarts, sampleIds, side = "right") - 1
+        return pieceInds, (sampleIds - self.pieceSampleStarts[pieceInds])*self.gap
 
     def shuffleInds(self):
-        np.random.shuffle(self.indices)
+        (self.random if self.random is not None else np.random).shuffle(self.indices)
 
     def on_epoch_end(self):
         self.shuffleInds()
@@ -117,36 +219,99 @@ class DataGen(keras.utils.Sequence):
         return distinctSamples//self.batchSize
 
 
+    def iterBatches(self, epochs = 1):
+        """
+        Plain numpy iterator over the batches, shuffling after every epoch
+
+        Parameters
+        ----------
+        epochs: int
+            Number of times every batch is given
+
+        Returns: generator of batches
+        """
+        for _ in range(epochs):
+            for index in range(len(self)):
+                yield self[index]
+            self.on_epoch_end()
+
+
+    def toTfDataset(self, shuffle = True, shuffleBuffer = None, seed = None, parallelCalls = None, prefetch = None):
+        """
+        tf.data pipeline of the batches. Sample ids are shuffled and batched by tf.data and
+        batches are built in parallel by getBatch, so training does not go through __getitem__.
+        Only full batches are given, like __len__
+
+        Parameters
+        ----------
+        shuffle: bool
+            If samples are shuffled every epoch
+        shuffleBuffer: int
+            Size of the shuffle buffer. Defaults to every sample
+        seed: int
+            Seed of the shuffling
+        parallelCalls: int
+            Number of batches built at once. Defaults to tf.data.AUTOTUNE
+        prefetch: int
+            Number of batches built ahead. Defaults to tf.data.AUTOTUNE
+
+        Returns: tf.data.Dataset
+        """
+        import tensorflow as tf
+        example = _toTuples(self.getBatch(np.arange(self.batchSize)))
+        flatExample = tf.nest.flatten(example)
+        outputTypes = [tf.as_dtype(array.dtype) for array in flatExample]
+
+        def buildBatch(sampleIds):
+            flat = tf.numpy_function(lambda ids: tf.nest.flatten(self.getBatch(ids)), [sampleIds], outputTypes)
+            for tensor, array in zip(flat, flatExample):
+                tensor.set_shape(array.shape)
+            return tf.nest.pack_sequence_as(example, flat)
+
+        dataset = tf.data.Dataset.range(len(self.indices))
+        if(shuffle):
+            dataset = dataset.shuffle(shuffleBuffer if shuffleBuffer != None else len(self.indices), seed = seed, reshuffle_each_iteration = True)
+        dataset = dataset.batch(self.batchSize, drop_remainder = True)
+        dataset = dataset.map(buildBatch, num_parallel_calls = parallelCalls if parallelCalls != None else tf.data.AUTOTUNE)
+        return dataset.prefetch(prefetch if prefetch != None else tf.data.AUTOTUNE)
+
+
 
 
 
 class DataGenOnOffNet(DataGen):
 
-    def __init__(self, encodedMidis,   batchSize, lookback, gap):
-        super().__init__(encodedMidis,  batchSize=batchSize, lookback=lookback, gap=gap)
+    def __init__(self, encodedMidis,   batchSize, lookback, gap, sparse = False):
+        super().__init__(encodedMidis,  batchSize=batchSize, lookback=lookback, gap=gap, sparse=sparse)
     
     def updateEncoders(self):
-        self.ohe = OneHotEncoder(categories=self.ranges, sparse=False)
+        self.ohe = self._fitEncoder(OneHotEncoder(categories=self.ranges, sparse=False))
+        self._updateLookups()
         
 
     def _encodeBatch(self, xEncodedSamples, yEncodedSamples):
-        xSamples = np.array([self.ohe.fit_transform(sample.reshape(-1,1)) for sample in xEncodedSamples])
-        ySamples = self.ohe.fit_transform(yEncodedSamples.reshape(-1,1))
+        if(self.sparse):
+            return self._sparse(xEncodedSamples), self._sparse(yEncodedSamples)
+        xSamples = self._oneHot(xEncodedSamples)
+        ySamples = self._oneHot(yEncodedSamples)
         return xSamples, ySamples
         
 
 class DataGenEmbeddedOnOffNet(DataGen):
 
-    def __init__(self, encodedMidis,  batchSize, lookback, gap):
-        super().__init__(encodedMidis, batchSize=batchSize, lookback=lookback, gap=gap)
+    def __init__(self, encodedMidis,  batchSize, lookback, gap, sparse = False):
+        super().__init__(encodedMidis, batchSize=batchSize, lookback=lookback, gap=gap, sparse=sparse)
 
     def updateEncoders(self):
-        self.ordEnc = OrdinalEncoder(categories=self.ranges)
-        self.ohe = OneHotEncoder(categories=self.ranges, sparse=False)
+        self.ordEnc = self._fitEncoder(OrdinalEncoder(categories=self.ranges))
+        self.ohe = self._fitEncoder(OneHotEncoder(categories=self.ranges, sparse=False))
+        self._updateLookups()
 
     def _encodeBatch(self, xEncodedSamples, yEncodedSamples):
-        x = np.array([self.ordEnc.fit_transform(sample.reshape(-1,1)) for sample in xEncodedSamples]).reshape(self.batchSize, self.lookback)
-        y = self.ohe.fit_transform(yEncodedSamples.reshape(-1,1))
+        if(self.sparse):
+            return self._sparse(xEncodedSamples).reshape(self.batchSize, self.lookback), self._sparse(yEncodedSamples)
+        x = self._ordinal(xEncodedSamples).reshape(self.batchSize, self.lookback)
+        y = self._oneHot(yEncodedSamples)
         return x,y
 
 
@@ -154,18 +319,22 @@ class DataGenEmbeddedOnOffNet(DataGen):
 
 class DataGenMultiNet(DataGen):
 
-    def __init__(self, encodedMidis, batchSize, lookback, gap):
-        super().__init__(encodedMidis, batchSize=batchSize, lookback=lookback, gap=gap)
+    def __init__(self, encodedMidis, batchSize, lookback, gap, sparse = False):
+        super().__init__(encodedMidis, batchSize=batchSize, lookback=lookback, gap=gap, sparse=sparse)
 
     
     def updateEncoders(self):
-        self.ohe = OneHotEncoder(categories=self.ranges, sparse=False)
+        self.ohe = self._fitEncoder(OneHotEncoder(categories=self.ranges, sparse=False))
         self.nClassesNotes = len(self.ranges[0])
         self.nClassesTimes = len(self.ranges[1])
+        self._updateLookups()
 
     def _encodeBatch(self, xEncodedSamples, yEncodedSamples):
-        xSamples = np.array([self.ohe.fit_transform(sample) for sample in xEncodedSamples])
-        y = self.ohe.fit_transform(yEncodedSamples)
+        if(self.sparse):
+            y = self._sparse(yEncodedSamples)
+            return self._sparse(xEncodedSamples), [y[:,0], y[:,1]]
+        xSamples = self._oneHot(xEncodedSamples)
+        y = self._oneHot(yEncodedSamples)
         yNotes = y[:,:self.nClassesNotes]
         yTimes = y[:,self.nClassesNotes:]
         return xSamples, [yNotes,yTimes]
@@ -176,20 +345,24 @@ class DataGenMultiNet(DataGen):
 
 
 class DataGenEmbeddedMultiNet(DataGenMultiNet):
-    def __init__(self, encodedMidis,  batchSize, lookback, gap):
-        super().__init__(encodedMidis, batchSize=batchSize, lookback=lookback, gap=gap)
+    def __init__(self, encodedMidis,  batchSize, lookback, gap, sparse = False):
+        super().__init__(encodedMidis, batchSize=batchSize, lookback=lookback, gap=gap, sparse=sparse)
         
 
     def updateEncoders(self):
         self.nClassesNotes = len(self.ranges[0])
         self.nClassesTimes = len(self.ranges[1])
-        self.ordEnc = OrdinalEncoder(categories=self.ranges)
-        self.ohe = OneHotEncoder(categories=self.ranges, sparse=False)
+        self.ordEnc = self._fitEncoder(OrdinalEncoder(categories=self.ranges))
+        self.ohe = self._fitEncoder(OneHotEncoder(categories=self.ranges, sparse=False))
+        self._updateLookups()
 
 
     def _encodeBatch(self, xEncodedSamples, yEncodedSamples):
-        x = np.array([self.ordEnc.fit_transform(sample) for sample in xEncodedSamples])
-        y = self.ohe.fit_transform(yEncodedSamples)
+        if(self.sparse):
+            x, y = self._sparse(xEncodedSamples), self._sparse(yEncodedSamples)
+            return (x[:,:,0], x[:,:,1]), (y[:,0], y[:,1])
+        x = self._ordinal(xEncodedSamples)
+        y = self._oneHot(yEncodedSamples)
 
         xNotes = x[:,:,0]
         xTimes = x[:,:,1]
@@ -202,25 +375,28 @@ class DataGenEmbeddedMultiNet(DataGenMultiNet):
 
 class DataGenGuideNet(DataGen):
 
-    def __init__(self, encodedMidis, batchSize, lookback, gap):
-        super().__init__(encodedMidis, batchSize=batchSize, lookback=lookback, gap=gap)
+    def __init__(self, encodedMidis, batchSize, lookback, gap, sparse = False):
+        super().__init__(encodedMidis, batchSize=batchSize, lookback=lookback, gap=gap, sparse=sparse)
         
     
     def updateEncoders(self):
         self.nClassesNotes = len(self.ranges[0])
         self.nClassesTimes = len(self.ranges[1])
-        self.ordEnc = OrdinalEncoder(categories=self.ranges)
-        self.ohe = OneHotEncoder(categories=self.ranges, sparse=False)
+        self.ordEnc = self._fitEncoder(OrdinalEncoder(categories=self.ranges))
+        self.ohe = self._fitEncoder(OneHotEncoder(categories=self.ranges, sparse=False))
+        self._updateLookups()
 
 
     def _getXYEncodedSamples(self, xIndices, yIndices):
-        xEncodedSamples = [np.array(self.encodedMidis[xStartInd[0]])[xStartInd[1]:xStartInd[1]+self.lookback] for xStartInd in np.array(xIndices)]
-        yEncodedSamples = [np.array(self.encodedMidis[xStartInd[0]])[xStartInd[1]+1:xStartInd[1]+self.lookback+1] for xStartInd in np.array(xIndices)]
-        return np.stack(xEncodedSamples), np.stack(yEncodedSamples)
+        xStarts = self.encodedMidis.positions(*xIndices)
+        return self.encodedMidis.windows(xStarts, self.lookback), self.encodedMidis.windows(xStarts+1, self.lookback)
 
     def _encodeBatch(self, xEncodedSamples, yEncodedSamples):
-        x = np.array([self.ordEnc.fit_transform(sample) for sample in xEncodedSamples])
-        y = np.array([self.ohe.fit_transform(sample) for sample in yEncodedSamples])
+        if(self.sparse):
+            x, y = self._sparse(xEncodedSamples), self._sparse(yEncodedSamples)
+            return (x[:,:,0], x[:,:,1]), (y[:,:,0], y[:,:,1])
+        x = self._ordinal(xEncodedSamples)
+        y = self._oneHot(yEncodedSamples)
 
         xNotes = x[:,:,0]
         xTimes = x[:,:,1]
@@ -234,23 +410,163 @@ class DataGenMiniBachStyle(DataGen):
     def __init__(self, encodedMidis, batchSize, lookback, gap):
         super().__init__(encodedMidis, batchSize=batchSize, lookback=lookback, gap=gap)
 
+    #Time units are lists of notes so pieces stay as lists until updateEncoders makes them multi hot rows
+    def _toCorpus(self, encodedMidis):
+        return encodedMidis
+
     def getRanges(self):
-        return list(set(list(chain.from_iterable(list(chain.from_iterable(self.encodedMidis))))))
+        if(self._isIntegerCoded()):
+            return self._getIntegerRanges()
+        counts = Counter(chain.from_iterable(chain.from_iterable(self.encodedMidis)))
+        ranges = list(set(counts))
+        self.frequencies = [np.array([counts[note] for note in ranges], dtype = np.int64)]
+        return ranges
+
+    #Ranges are the labels of the codes so they are the same classes as for string labels
+    def _getIntegerRanges(self):
+        self.codes, counts = np.unique(np.concatenate([codes for codes, _ in self.encodedMidis]), return_counts = True)
+        ranges = [DecimalEncoderMiniBachStyle.codeToLabel(code) for code in self.codes.tolist()]
+        nEmpty = sum(int(np.count_nonzero(np.diff(offsets) == 0)) for _, offsets in self.encodedMidis)
+        if(nEmpty > 0):
+            ranges.append("none")
+            counts = np.append(counts, nEmpty)
+        self.frequencies = [counts]
+        return ranges
+
+    #If pieces are (<codes>, <offsets>) from DecimalEncoderMiniBachStyle.encodeIntegers
+    def _isIntegerCoded(self):
+        return not isinstance(self.encodedMidis, EncodedCorpus) and len(self.encodedMidis) > 0 and isinstance(self.encodedMidis[0], tuple)
+
+    def _getPieceLengths(self):
+        if(self._isIntegerCoded()):
+            return np.array([len(offsets)-1 for _, offsets in self.encodedMidis], dtype = np.int64)
+        return super()._getPieceLengths()
 
+    #Pieces are stored once as multi hot rows of every time unit, so batches are slices of rows
     def updateEncoders(self):
-        self.mlb = MultiLabelBinarizer(classes=self.ranges)
+        self.mlb = MultiLabelBinarizer(classes=self.ranges).fit([self.ranges])
+        if(not isinstance(self.encodedMidis, EncodedCorpus)):
+            self.encodedMidis = self._toMultiHot()
+
+    def _toMultiHot(self):
+        lengths = self._getPieceLengths()
+        if(self._isIntegerCoded()):
+            timeUnitLengths = np.concatenate([np.diff(offsets) for _, offsets in self.encodedMidis])
+            rows = np.zeros((len(timeUnitLengths), len(self.ranges)), dtype = np.uint8)
+            codes = np.concatenate([codes for codes, _ in self.encodedMidis])
+            rows[np.repeat(np.arange(len(timeUnitLengths)), timeUnitLengths), np.searchsorted(self.codes, codes)] = 1
+            if("none" in self.ranges):
+                rows[timeUnitLengths == 0, self.ranges.index("none")] = 1
+        else:
+            columns = {note: i for i, note in enumerate(self.ranges)}
+            timeUnits = list(chain.from_iterable(self.encodedMidis))
+            rows = np.zeros((len(timeUnits), len(self.ranges)), dtype = np.uint8)
+            rowInds = np.repeat(np.arange(len(timeUnits)), [len(timeUnit) for timeUnit in timeUnits])
+            rows[rowInds, [columns[note] for note in chain.from_iterable(timeUnits)]] = 1
+        return EncodedCorpus(rows, np.cumsum(lengths) - lengths, lengths)
     
     def _encodeBatch(self, xEncodedSamples, yEncodedSamples):
-        xBatch = []
-        for batch in xEncodedSamples:
-            xSample = self.mlb.fit_transform(batch)
-            xBatch.append(xSample.reshape(-1))
-        xBatch = np.stack(xBatch)
-        yBatch = self.mlb.fit_transform(yEncodedSamples)
-        print(xBatch.shape, yBatch.shape)
+        xBatch = xEncodedSamples.reshape(len(xEncodedSamples), -1).astype(np.int64)
+        yBatch = yEncodedSamples.astype(np.int64)
         return xBatch, yBatch
-    
-    def _getXYEncodedSamples(self, xIndices, yIndices):
-        xEncodedSamples = [self.encodedMidis[xStartInd[0]][xStartInd[1]:xStartInd[1]+self.lookback] for xStartInd in np.array(xIndices)]
-        yEncodedSamples = [self.encodedMidis[yInd[0]][yInd[1]] for yInd in np.array(yIndices)]
-        return xEncodedSamples, yEncodedSamples
+
+
+
+
+
+class PrefetchDataGen(keras.utils.Sequence):
+
+    def __init__(self, datagen, workers = 4, queueSize = 8, seed = None, processes = False):
+        """
+        Wraps a DataGen so the next batches are built by a pool of workers while the network
+        trains on the current one. Batches are the same as the wrapped generator gives
+
+        Parameters
+        ----------
+        datagen: DataGen
+            Generator the batches are built by
+        workers: int
+            Number of threads or processes building batches
+        queueSize: int
+            Maximum number of batches built ahead
+        seed: int
+            Seed of the shuffling of the wrapped generator, so the order of batches is the same
+            every run. If None the shuffling uses np.random
+        processes: bool
+            If batches are built in processes instead of threads. Each process gets a copy of datagen
+        """
+        self.datagen = datagen
+        self.queueSize = queueSize
+        self.processes = processes
+        if(seed != None):
+            datagen.random = np.random.RandomState(seed)
+            datagen.indices = datagen.getIndices()
+            datagen.shuffleInds()
+        if(processes):
+            self.pool = ProcessPoolExecutor(workers, initializer = _initPrefetchWorker, initargs = (datagen,))
+        else:
+            self.pool = ThreadPoolExecutor(workers)
+        self.futures = {}
+
+
+    def __len__(self):
+        return len(self.datagen)
+
+    def __getitem__(self, index):
+        if(index < 0):
+            index += len(self)
+        for stale in [i for i in self.futures if i < index or i >= index + self.queueSize]:
+            self.futures.pop(stale).cancel()
+        for ahead in range(index, min(index + self.queueSize, len(self))):
+            if(ahead not in self.futures):
+                self.futures[ahead] = self._submit(ahead)
+        return self.futures.pop(index).result()
+
+    #Batches being built are finished before the wrapped generator shuffles
+    def on_epoch_end(self):
+        self._cancel()
+        self.datagen.on_epoch_end()
+
+    def close(self):
+        self._cancel()
+        self.pool.shutdown()
+
+
+    #Attributes like the encoders are those of the wrapped generator
+    def __getattr__(self, name):
+        if(name == "datagen"):
+            raise AttributeError(name)
+        return getattr(self.datagen, name)
+
+
+    def _submit(self, index):
+        xIndices = self.datagen._getBatchIndices(index)
+        if(self.processes):
+            return self.pool.submit(_prefetchBatch, xIndices)
+        return self.pool.submit(self.datagen.getBatch, xIndices)
+
+    def _cancel(self):
+        for future in self.futures.values():
+            future.cancel()
+        wait(list(self.futures.values()))
+        self.futures = {}
+
+
+
+#tf.data treats lists as tensors, so batches are given as nested tuples
+def _toTuples(batch):
+    if(isinstance(batch, (list, tuple))):
+        return tuple(_toTuples(part) for part in batch)
+    return batch
+
+
+
+#Generator each prefetching process builds batches with
+_prefetchDatagen = None
+
+def _initPrefetchWorker(datagen):
+    global _prefetchDatagen
+    _prefetchDatagen = datagen
+
+def _prefetchBatch(xIndices):
+    return _prefetchDatagen.getBatch(xIndices)
@@ -1,7 +1,9 @@
 #Encodes all queued midis to list of integers
 
-from midi_parser.midi_parser import RelativeNote, DurationalNote
+from midi_parser.midi_parser import RelativeNote, DurationalNote, NoteArray, TimeUnitArray
 from mido import MidiFile
+import numpy as np
+from operator import attrgetter
 
 
 from os import walk
@@ -16,7 +18,7 @@ class DecimalEncoder:
 
         Parameters
         ----------
-        parsedMidis: list[list]
+        parsedMidis: list[list] or list[NoteArray]
             Midis that were parsed by MidiParser
         ranges: dict[list]
             All possible values that each dimension can get
@@ -61,6 +63,8 @@ class DecimalEncoderOnOff(DecimalEncoderWithTimes):
     
 
     def _encodeOne(self, piece):
+        if(isinstance(piece, NoteArray)):
+            return self._order(self._encodeArray(piece))
         oneEncoded = []
         for note in piece:
             if(note.time>0):
@@ -70,22 +74,25 @@ class DecimalEncoderOnOff(DecimalEncoderWithTimes):
             else:
                 oneEncoded.append(note.pitch)
         return self._order(oneEncoded)
+
+    #Same as the loop in _encodeOne over the columns of a NoteArray
+    def _encodeArray(self, piece):
+        timeUnits = 299 + np.minimum(piece.times, self.nClassesTimes)
+        notes = np.where(piece.types == NoteArray.NOTE_ON, 150 + piece.pitches.astype(np.int64), piece.pitches)
+        keep = np.stack([piece.times > 0, np.ones(len(piece), dtype = bool)], axis = 1).reshape(-1)
+        return np.stack([timeUnits, notes], axis = 1).reshape(-1)[keep]
     
 
-    #Orders between time units for consistency reasons
+    #Orders between time units for consistency reasons. A time unit is the notes up to and including the next wait token (>= 300), sorted without repeats
     def _order(self, oneEncoded):
-        pointer = 0
-        ordered = []
-        while pointer<len(oneEncoded):
-            curStream = []
-            while pointer<len(oneEncoded) and oneEncoded[pointer]<300:
-                curStream.append(oneEncoded[pointer])
-                pointer+=1
-            if(pointer<len(oneEncoded)):
-                curStream.append(oneEncoded[pointer])
-            ordered.extend(sorted(list(set(curStream))))
-            pointer+=1
-        return ordered
+        tokens = np.asarray(oneEncoded, dtype = np.int64)
+        isWait = tokens >= 300
+        timeUnits = np.cumsum(isWait) - isWait
+        order = np.lexsort((tokens, timeUnits))
+        tokens, timeUnits = tokens[order], timeUnits[order]
+        keep = np.ones(len(tokens), dtype = bool)
+        keep[1:] = (tokens[1:] != tokens[:-1]) | (timeUnits[1:] != timeUnits[:-1])
+        return tokens[keep].tolist()
     
 
 
@@ -104,27 +111,29 @@ class DecimalEncoderMultiNet(DecimalEncoderWithTimes):
       
 
 
+    #Notes of each time unit are sorted by pitch keeping the first note of each pitch, and waits next to each other are merged into one
     def _encodeOne(self, piece):
         encoded = []
-        for i,note in enumerate(piece):
-    
-            note = self._encodeEvent(note)
-            if(i>0 and note[0]==300 and encoded[-1][0]==300):
-                encoded[-1][1]+=note[1]
-                continue
-
-            searchInd = 0
-            lastInd = len(encoded)-1
-            while(lastInd-searchInd>=0 and note[0] < encoded[lastInd-searchInd][0] and encoded[lastInd-searchInd][0]!=300):
-                searchInd += 1
-            if(lastInd-searchInd>=0 and note[0] == encoded[lastInd-searchInd][0]):
-                continue
-            encoded.insert(lastInd+1 - searchInd, note)
-                
-
+        timeUnit = {}
+        for note in self._encodeEvents(piece):
+            if(note[0] != 300):
+                if(note[0] not in timeUnit):
+                    timeUnit[note[0]] = note
+            elif(len(timeUnit) == 0 and len(encoded) > 0 and encoded[-1][0] == 300):
+                encoded[-1][1] += note[1]
+            else:
+                encoded.extend(sorted(timeUnit.values()))
+                timeUnit = {}
+                encoded.append(note)
+        encoded.extend(sorted(timeUnit.values()))
         return encoded
 
     
+    def _encodeEvents(self, piece):
+        if(isinstance(piece, NoteArray)):
+            return np.stack([np.where(piece.types == NoteArray.TIME_UNIT, 300, piece.pitches), piece.times], axis = 1).tolist()
+        return [self._encodeEvent(evt) for evt in piece]
+
     def _encodeEvent(self, evt):
         if(evt.type == "time_unit"):
             return [300, evt.time]
@@ -139,6 +148,9 @@ class DecimalEncoderMiniBachStyle(DecimalEncoder):
     Seperated out into each time unit and the notes that are played
     """
 
+    #Integer code of a time unit without notes, which has the label "none"
+    NONE = -1
+
 
     def __init__(self, parsedMidis):
         try:
@@ -148,6 +160,8 @@ class DecimalEncoderMiniBachStyle(DecimalEncoder):
         super().__init__(parsedMidis)
     
     def _encodeOne(self, piece):
+        if(isinstance(piece, TimeUnitArray)):
+            return self.decodeIntegers(*self._encodeOneIntegers(piece))
         encoded = []
         for timeUnit in piece:
             timeUnit.sort(key = lambda x: x.pitch)
@@ -161,3 +175,56 @@ class DecimalEncoderMiniBachStyle(DecimalEncoder):
         return evt.type+"_"+str(evt.pitch)
 
 
+    def encodeIntegers(self):
+        """
+        Integer coded version of encode. Each note is 2*<pitch> + 1 for note_ons or 2*<pitch>
+        for note_offs, and the notes of every time unit of a piece are in one array
+
+        Returns: list of (<codes>, <offsets>) for each piece. The notes of time unit i are
+        codes[offsets[i]:offsets[i+1]] and time units without notes are empty
+        """
+        return [self._encodeOneIntegers(piece) for piece in self.parsedMidis]
+
+    def _encodeOneIntegers(self, piece):
+        if(isinstance(piece, TimeUnitArray)):
+            notes = piece.notes
+            order = np.lexsort((notes.pitches, piece.units))
+            codes = 2*notes.pitches[order] + (notes.types[order] == NoteArray.NOTE_ON)
+            return codes.astype(np.int16), piece.offsets.copy()
+        codes = [self._encodeEvtInteger(note) for timeUnit in piece for note in sorted(timeUnit, key = attrgetter("pitch"))]
+        offsets = np.zeros(len(piece)+1, dtype = np.int64)
+        offsets[1:] = np.cumsum([len(timeUnit) for timeUnit in piece])
+        return np.array(codes, dtype = np.int16), offsets
+
+    def _encodeEvtInteger(self, evt):
+        return 2*evt.pitch + (evt.type == "note_on")
+
+
+    @staticmethod
+    def labelToCode(label):
+        """
+        Returns: integer code of a label of encode, like "note_on_60" -> 121
+        """
+        if(label == "none"):
+            return DecimalEncoderMiniBachStyle.NONE
+        _type, pitch = label.rsplit("_", 1)
+        return 2*int(pitch) + (_type == "note_on")
+
+    @staticmethod
+    def codeToLabel(code):
+        """
+        Returns: label of encode of an integer code, like 121 -> "note_on_60"
+        """
+        if(code == DecimalEncoderMiniBachStyle.NONE):
+            return "none"
+        return ("note_on_" if code%2 == 1 else "note_off_") + str(code//2)
+
+    @staticmethod
+    def decodeIntegers(codes, offsets):
+        """
+        Returns: a piece of encodeIntegers as the lists of labels encode gives
+        """
+        labels = [DecimalEncoderMiniBachStyle.codeToLabel(code) for code in codes.tolist()]
+        return [labels[start:end] if end > start else ["none"] for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+
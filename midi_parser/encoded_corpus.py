@@ -0,0 +1,255 @@
+#On disk store of encoded pieces that data generators can memory map
+
+import os
+import numpy as np
+
+
+
+
+class Vocabulary:
+
+    FILE = "vocabulary.npz"
+
+    def __init__(self, values, counts):
+        """
+        Distinct tokens of a corpus and how often each occurs
+
+        Parameters
+        ----------
+        values: list[array]
+            Sorted distinct values of each dimension of the tokens
+        counts: list[array]
+            Number of times each value occurs
+        """
+        self.values = values
+        self.counts = counts
+
+
+    @staticmethod
+    def fromChunks(chunks):
+        """
+        Counts tokens in one pass over chunks, so memory mapped corpora are counted without
+        being read into memory at once
+
+        Parameters
+        ----------
+        chunks: iterable[array]
+            Arrays of tokens of shape (<n tokens>,) or (<n tokens>, <n dimensions>)
+
+        Returns: Vocabulary
+        """
+        values, counts = None, None
+        for chunk in chunks:
+            chunk = np.asarray(chunk)
+            chunk = chunk.reshape(len(chunk), -1)
+            if(values == None):
+                values = [np.zeros(0, dtype = chunk.dtype) for _ in range(chunk.shape[1])]
+                counts = [np.zeros(0, dtype = np.int64) for _ in range(chunk.shape[1])]
+            for i in range(chunk.shape[1]):
+                chunkValues, chunkCounts = np.unique(chunk[:,i], return_counts = True)
+                values[i], inverse = np.unique(np.concatenate([values[i], chunkValues]), return_inverse = True)
+                merged = np.zeros(len(values[i]), dtype = np.int64)
+                np.add.at(merged, inverse, np.concatenate([counts[i], chunkCounts]))
+                counts[i] = merged
+        return Vocabulary(values if values != None else [], counts if counts != None else [])
+
+
+    @staticmethod
+    def load(folder):
+        with np.load(os.path.join(folder, Vocabulary.FILE)) as data:
+            nDimensions = len([name for name in data.files if name.startswith("values_")])
+            return Vocabulary([data["values_{}".format(i)] for i in range(nDimensions)], [data["counts_{}".format(i)] for i in range(nDimensions)])
+
+    def save(self, folder):
+        arrays = {}
+        for i, (values, counts) in enumerate(zip(self.values, self.counts)):
+            arrays["values_{}".format(i)] = values
+            arrays["counts_{}".format(i)] = counts
+        np.savez(os.path.join(folder, Vocabulary.FILE), **arrays)
+
+
+
+
+class EncodedCorpus:
+
+    TOKENS_FILE = "tokens.npy"
+    OFFSETS_FILE = "offsets.npy"
+
+    def __init__(self, tokens, starts, lengths, folder = None):
+        """
+        Encoded pieces stored as one contiguous token array. Piece i is
+        tokens[starts[i]:starts[i]+lengths[i]], so indexing a piece is a slice, not a copy,
+        and pieces can share the same tokens. If the corpus was opened from a folder the
+        tokens are memory mapped, so processes reading the same corpus share the page cache
+        and corpora larger than memory can be used
+
+        Parameters
+        ----------
+        tokens: array
+            Every encoded event of every piece. Shape (<n events>,) for one number per event
+            like DecimalEncoderOnOff or (<n events>, <n dimensions>) like DecimalEncoderMultiNet
+        starts: array
+            Index in tokens at which each piece starts
+        lengths: array
+            Number of events in each piece
+        folder: str
+            Folder the corpus was opened from
+        """
+        self.tokens = tokens
+        self.starts = np.asarray(starts, dtype = np.int64)
+        self.lengths = np.asarray(lengths, dtype = np.int64)
+        self.folder = folder
+        self.vocabulary = None
+
+
+    @staticmethod
+    def fromEncoded(encodedMidis, dtype = None):
+        """
+        Parameters
+        ----------
+        encodedMidis: list[list]
+            Output of a decimal encoder
+        dtype: numpy dtype
+            Type of tokens. Defaults to the type numpy picks for the events
+
+        Returns: EncodedCorpus
+        """
+        pieces = [np.asarray(piece, dtype = dtype) for piece in encodedMidis]
+        nonEmpty = [piece for piece in pieces if len(piece) > 0]
+        rowShape = nonEmpty[0].shape[1:] if len(nonEmpty) > 0 else ()
+        if(dtype == None and len(nonEmpty) > 0):
+            dtype = np.result_type(*{piece.dtype for piece in nonEmpty})
+        pieces = [piece.astype(dtype, copy = False).reshape((len(piece),) + rowShape) for piece in pieces]
+        lengths = np.array([len(piece) for piece in pieces], dtype = np.int64)
+        tokens = np.concatenate(pieces) if len(pieces) > 0 else np.zeros((0,) + rowShape, dtype = dtype)
+        return EncodedCorpus(tokens, np.cumsum(lengths) - lengths, lengths)
+
+
+    @staticmethod
+    def open(folder, mmap = True):
+        """
+        Opens a corpus written by save
+
+        Parameters
+        ----------
+        folder: str
+            Folder corpus was saved in
+        mmap: bool
+            If tokens should be memory mapped instead of read into memory
+
+        Returns: EncodedCorpus
+        """
+        tokens = np.load(os.path.join(folder, EncodedCorpus.TOKENS_FILE), mmap_mode = "r" if mmap else None)
+        offsets = np.load(os.path.join(folder, EncodedCorpus.OFFSETS_FILE))
+        corpus = EncodedCorpus(tokens, offsets[:-1], np.diff(offsets), folder = folder if mmap else None)
+        if(os.path.exists(os.path.join(folder, Vocabulary.FILE))):
+            corpus.vocabulary = Vocabulary.load(folder)
+        return corpus
+
+
+    def save(self, folder):
+        """
+        Writes corpus as a token array and an array of piece offsets, along with its vocabulary.
+        Piece i of the saved corpus is tokens[offsets[i]:offsets[i+1]]
+
+        Parameters
+        ----------
+        folder: str
+            Folder corpus is written to. Created if it does not exist
+        """
+        os.makedirs(folder, exist_ok = True)
+        offsets = np.zeros(len(self)+1, dtype = np.int64)
+        offsets[1:] = np.cumsum(self.lengths)
+        np.save(os.path.join(folder, EncodedCorpus.TOKENS_FILE), self.flat())
+        np.save(os.path.join(folder, EncodedCorpus.OFFSETS_FILE), offsets)
+        self.getVocabulary().save(folder)
+
+
+    def getVocabulary(self, chunkSize = 2**20):
+        """
+        Parameters
+        ----------
+        chunkSize: int
+            Number of tokens counted at once
+
+        Returns: Vocabulary of the pieces, counted once and then kept
+        """
+        if(self.vocabulary == None):
+            self.vocabulary = Vocabulary.fromChunks(self._chunks(chunkSize))
+        return self.vocabulary
+
+
+    def flat(self):
+        """
+        Returns: array of the tokens of every piece in order. A view of tokens if the pieces
+        follow each other in tokens
+        """
+        if(len(self) == 0):
+            return self.tokens[:0]
+        if(self._isContiguous()):
+            return self.tokens[self.starts[0]:self.starts[0]+self.lengths.sum()]
+        return np.concatenate([self[i] for i in range(len(self))])
+
+
+    def positions(self, pieceInds, offsets):
+        """
+        Returns: array of the indices in tokens of offsets into pieces
+        """
+        return self.starts[pieceInds] + offsets
+
+
+    def windows(self, positions, length):
+        """
+        Gathers a window of tokens starting at each position with a single fancy index
+
+        Parameters
+        ----------
+        positions: array
+            Indices in tokens the windows start at, as returned by positions
+        length: int
+            Number of tokens in each window
+
+        Returns: array of shape (<n positions>, length) + <token shape>
+        """
+        return self.tokens[np.asarray(positions)[:,None] + np.arange(length)]
+
+
+    def __len__(self):
+        return len(self.lengths)
+
+
+    #An int gives the tokens of a piece, a slice or array of piece indices gives a corpus sharing the same tokens
+    def __getitem__(self, i):
+        if(isinstance(i, (int, np.integer))):
+            start = self.starts[i]
+            return self.tokens[start:start+self.lengths[i]]
+        return EncodedCorpus(self.tokens, self.starts[i], self.lengths[i], folder = self.folder)
+
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+    #Memory mapped tokens are opened again when unpickled instead of being copied
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if(self.folder != None):
+            state["tokens"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if(self.folder != None):
+            self.tokens = np.load(os.path.join(self.folder, EncodedCorpus.TOKENS_FILE), mmap_mode = "r")
+
+
+    #Tokens of the pieces in chunks of at most chunkSize tokens, without copying
+    def _chunks(self, chunkSize):
+        if(self._isContiguous()):
+            tokens = self.flat()
+            return (tokens[i:i+chunkSize] for i in range(0, len(tokens), chunkSize))
+        return (piece[i:i+chunkSize] for piece in self for i in range(0, len(piece), chunkSize))
+
+    #If pieces follow each other in tokens in order
+    def _isContiguous(self):
+        return len(self) == 0 or bool(np.all(self.starts[1:] == self.starts[:-1] + self.lengths[:-1]))
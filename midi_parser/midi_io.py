@@ -0,0 +1,157 @@
+#Reads the bytes of midis from files through mmap, or from members of zip and tar archives without extracting them
+
+from contextlib import contextmanager
+import mmap
+import os
+import tarfile
+import zipfile
+
+
+
+
+ZIP_EXTENSIONS = (".zip",)
+TAR_EXTENSIONS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+#Archives held open by this process as [<ZipFile or TarFile>, <members>, <number of holders>], keyed by
+#(<archive path>, <pid>) so forked workers never share a file offset
+_openArchives = {}
+
+
+
+
+def isArchive(_path):
+    """
+    Returns: if _path is a zip or tar archive file
+    """
+    return _path.lower().endswith(ZIP_EXTENSIONS + TAR_EXTENSIONS) and os.path.isfile(_path)
+
+
+def findArchiveMidis(archive):
+    """
+    Midis in an archive are named <archive path>/<member name>, so they can be queued and
+    cached like any other midi path. Members of compressed tars are read by decompressing
+    the tar up to them, so zips or uncompressed tars are much faster to parse from
+
+    Parameters
+    ----------
+    archive: str
+        Path of zip or tar archive
+
+    Returns: list of paths of the midis in the archive
+    """
+    opened, members = _loadArchive(archive)
+    opened.close()
+    return [os.path.join(archive, name) for name in members if ".mid" in os.path.basename(name)]
+
+
+def splitArchivePath(_path):
+    """
+    Returns: (<archive path>, <member name>) of a midi in an archive, or (None, _path) if it is a file
+    """
+    if(os.path.isfile(_path)):
+        return None, _path
+    archive = _path
+    while(True):
+        parent = os.path.dirname(archive)
+        if(parent == archive):
+            return None, _path
+        archive = parent
+        if(isArchive(archive)):
+            return archive, _path[len(archive)+1:]
+
+
+@contextmanager
+def openMidi(_path):
+    """
+    Opens the bytes of a midi without reading the file with open/read. Files are memory
+    mapped, so reading the same corpus again is served from the page cache without a copy
+    per process. Midis in an archive are read from it while it is held by holdArchives,
+    otherwise the archive is opened just for the midi
+
+    Parameters
+    ----------
+    _path: str
+        Path of a midi file or of a midi in an archive, as returned by findArchiveMidis
+
+    Yields: mmap of a file or bytes of an archive member. An mmap is closed after the with block
+    """
+    archive, name = splitArchivePath(_path)
+    if(archive != None):
+        key = (archive, os.getpid())
+        if(key in _openArchives):
+            yield _readMember(*_openArchives[key][:2], name)
+            return
+        opened, members = _loadArchive(archive)
+        with opened:
+            data = _readMember(opened, members, name)
+        yield data
+        return
+    with open(_path, "rb") as f:
+        if(os.fstat(f.fileno()).st_size == 0):
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as data:
+            yield data
+
+
+def findArchives(paths):
+    """
+    Returns: sorted list of the archives the midis of paths are in
+    """
+    return sorted({archive for archive, _ in map(splitArchivePath, paths) if archive != None})
+
+
+@contextmanager
+def holdArchives(paths):
+    """
+    Keeps the archives of midis open for the with block, so they are opened once instead of
+    once per midi. Archives held by someone else as well stay open until they are released too
+
+    Parameters
+    ----------
+    paths: list[str]
+        Paths of midis, of which those in archives have their archive held
+    """
+    held = []
+    try:
+        for archive in findArchives(paths):
+            acquireArchive(archive)
+            held.append(archive)
+        yield
+    finally:
+        for archive in held:
+            releaseArchive(archive)
+
+
+def acquireArchive(archive):
+    """
+    Opens an archive for this process, or counts one more holder of it if it already is
+    """
+    key = (archive, os.getpid())
+    if(key not in _openArchives):
+        _openArchives[key] = list(_loadArchive(archive)) + [0]
+    _openArchives[key][2] += 1
+
+
+def releaseArchive(archive):
+    """
+    Closes an archive opened with acquireArchive once it has no holders left
+    """
+    key = (archive, os.getpid())
+    _openArchives[key][2] -= 1
+    if(_openArchives[key][2] == 0):
+        _openArchives.pop(key)[0].close()
+
+
+#Returns (<ZipFile or TarFile>, <dict of the info of each file by name>)
+def _loadArchive(archive):
+    if(archive.lower().endswith(ZIP_EXTENSIONS)):
+        opened = zipfile.ZipFile(archive)
+        return opened, {info.filename: info for info in opened.infolist() if not info.is_dir()}
+    opened = tarfile.open(archive)
+    return opened, {member.name: member for member in opened.getmembers() if member.isfile()}
+
+def _readMember(opened, members, name):
+    if(isinstance(opened, zipfile.ZipFile)):
+        return opened.read(members[name])
+    return opened.extractfile(members[name]).read()
@@ -1,6 +1,9 @@
 from datetime import time
 import itertools
+import io
+import os
 from os import walk, path
+from concurrent.futures import ProcessPoolExecutor
 from mido import MidiFile
 from numpy import argmin
 from itertools import chain, accumulate
@@ -10,7 +13,12 @@ from mido import MetaMessage, MidiTrack
 import math
 import logging
 import pickle
+import heapq
+from operator import attrgetter
 import pandas as pd
+from .parse_cache import ParseCache
+from .smf_reader import MidiNotes, NoteTrack, readMidiNotes
+from .midi_io import openMidi, isArchive, findArchiveMidis, findArchives, holdArchives, acquireArchive
 
 """
 This module provides tools that are strictly used for parsing midis
@@ -26,22 +34,44 @@ logger.setLevel("DEBUG")
 logger.addHandler(streamHandler)
 
 
-def parseToMidos(paths):
+def parseToMidos(paths, fast = False):
+    """
+    Parameters
+    ----------
+    paths: str or list[str]
+        Paths of midis. Midis in a zip or tar archive are <archive path>/<member name>
+    fast: bool
+        If midis should be read with readMidiNotes instead of mido. Only the notes, key
+        and ticks per beat are kept, which is all OneTrack needs
+
+    Returns: list of mido MidiFiles, or MidiNotes if fast
+    """
     midiObjs = []
 
     if(type(paths) != list):
         paths = [paths]
 
     for _path in paths:
-        mf = MidiFile(_path, type=0)
-        mf.tracks[0].insert(0,MetaMessage("track_name", name = _path))
-        midiObjs.append(mf)
+        with openMidi(_path) as data:
+            midiObjs.append(_loadMidi(_path, data, fast))
 
     return midiObjs
 
 
+#Reads a midi from the bytes openMidi gives
+def _loadMidi(_path, data, fast = False):
+    if(fast):
+        return readMidiNotes(data, name = _path)
+    mf = MidiFile(file = io.BytesIO(data) if isinstance(data, bytes) else data, type=0)
+    mf.filename = _path
+    mf.tracks[0].insert(0,MetaMessage("track_name", name = _path))
+    return mf
+
+
 def findMidis(folder, r=True):
     paths = []
+    if(isArchive(folder)):
+        return [_path for _path in findArchiveMidis(folder) if r or "/" not in _path[len(folder)+1:]]
     if(".mid" in folder):
         paths.append(folder)
         return paths
@@ -55,12 +85,160 @@ def findMidis(folder, r=True):
     return paths
 
 
+def mergeTracks(tracks, key = attrgetter("time")):
+    """
+    Merges tracks that are each already in time order into one time ordered track. Gives the
+    same order as concatenating the tracks and stable sorting them, so notes at the same time
+    stay in track order, but in O(n log k) for k tracks. The merge is lazy
+
+    Parameters
+    ----------
+    tracks: list[iterable]
+        Time ordered tracks. Can be generators
+    key: function
+        Time of an element of a track. Defaults to the time attribute of notes
+
+    Returns: iterator over the merged track
+    """
+    return heapq.merge(*tracks, key = key)
+
+
+#Binary format of parsed midis. Version of the format is stored in the file
+PARSED_VERSION = 1
+NPZ_MAGIC = b"PK\x03\x04"
+
+def writeParsed(parsed, fp):
+    """
+    Writes parsed OneTracks as one uncompressed npz. The note columns of every piece are
+    concatenated into flat arrays with offsets marking where each piece starts, so the whole
+    corpus is read back in one go. Works for lists of notes, NoteArrays, by_time_unit tracks and
+    TimeUnitArrays
+
+    Parameters
+    ----------
+    parsed: list
+        Output of MidiParser.parse
+    fp: str
+        Path of file. Written as is, no extension is added
+    """
+    kind = "notes"
+    units = None
+    nTimeUnits = None
+    if(len(parsed) > 0 and isinstance(parsed[0], NoteArray)):
+        kind = "note_arrays"
+        noteArrays = parsed
+    elif(len(parsed) > 0 and isinstance(parsed[0], TimeUnitArray)):
+        kind = "time_unit_arrays"
+        nTimeUnits = np.array([len(piece) for piece in parsed], dtype = np.int64)
+        units = np.concatenate([piece.units for piece in parsed])
+        noteArrays = [piece.notes for piece in parsed]
+    elif(len(parsed) > 0 and len(parsed[0]) > 0 and isinstance(parsed[0][0], list)):
+        kind = "by_time_unit"
+        nTimeUnits = np.array([len(piece) for piece in parsed], dtype = np.int64)
+        units = np.concatenate([np.repeat(np.arange(len(piece)), [len(timeUnit) for timeUnit in piece]) for piece in parsed])
+        noteArrays = [NoteArray.fromNotes(list(chain.from_iterable(piece))) for piece in parsed]
+    else:
+        noteArrays = [NoteArray.fromNotes(piece) for piece in parsed]
+
+    offsets = np.zeros(len(noteArrays)+1, dtype = np.int64)
+    offsets[1:] = np.cumsum([len(noteArray) for noteArray in noteArrays])
+    if(len(noteArrays) == 0):
+        noteArrays = [NoteArray([], [], [], [], [])]
+    columns = {field: np.concatenate([getattr(noteArray, field) for noteArray in noteArrays]) for field in NoteArray.FIELDS}
+    if(len(columns["times"]) == 0 or np.abs(columns["times"]).max() < 2**31):
+        columns["times"] = columns["times"].astype(np.int32)
+    noteClass = noteArrays[0].noteClass.__name__
+    extra = {} if units is None else {"units": units, "nTimeUnits": nTimeUnits}
+    with open(fp, "wb") as f:
+        np.savez(f, version = PARSED_VERSION, kind = kind, noteClass = noteClass, offsets = offsets, **columns, **extra)
+
+
+def readParsed(fp):
+    """
+    Reads OneTracks written by writeParsed. They come back in the same form they were written,
+    NoteArrays are views into the loaded columns
+
+    Returns: List of parsed OneTracks
+    """
+    with np.load(fp) as data:
+        data = dict(data)
+    if(data["version"] > PARSED_VERSION):
+        raise ValueError("{} was written by a newer version of writeParsed".format(fp))
+    kind = str(data["kind"])
+    noteClass = {_class.__name__: _class for _class in [RelativeNote, DurationalNote, AbsoluteNote, ByTimeUnitNote]}[str(data["noteClass"])]
+    corpus = NoteArray(*[data[field] for field in NoteArray.FIELDS], noteClass = noteClass)
+    offsets = data["offsets"]
+    pieces = [corpus[offsets[i]:offsets[i+1]] for i in range(len(offsets)-1)]
+    if(kind == "note_arrays"):
+        return pieces
+    if(kind == "notes"):
+        return [piece.toNotes() for piece in pieces]
+    if(kind == "time_unit_arrays"):
+        return [TimeUnitArray(piece, data["units"][offsets[i]:offsets[i+1]], data["nTimeUnits"][i]) for i, piece in enumerate(pieces)]
+
+    parsed = []
+    for i, piece in enumerate(pieces):
+        byTimeUnit = [[] for _ in range(data["nTimeUnits"][i])]
+        for unit, note in zip(data["units"][offsets[i]:offsets[i+1]].tolist(), piece):
+            byTimeUnit[unit].append(note)
+        parsed.append(byTimeUnit)
+    return parsed
+
+
+def isBinaryParsed(fp):
+    with open(fp, "rb") as f:
+        return f.read(len(NPZ_MAGIC)) == NPZ_MAGIC
+
+
+def parseToOneTrack(_path, noteRange, smallestTimeUnit, convertToC, timeMeasurement, mode = "both", columnar = False, fastReader = False, data = None):
+    """
+    Loads a single midi and flattens it to a OneTrack. Takes the same settings as MidiParser.
+    If data is given it is the bytes of the midi already opened with openMidi
+
+    Returns: OneTrack
+    """
+    mf = parseToMidos(_path, fast = fastReader)[0] if data == None else _loadMidi(_path, data, fastReader)
+    return OneTrack(mf, noteRange, smallestTimeUnit, convertToC, timeMeasurement, mode, columnar = columnar)
+
+
+#Returns (<valid>, <track>) of midi, going through the parse cache if there is one
+def _parseToTrack(_path, settings, cache = None):
+    if(cache == None):
+        ot = parseToOneTrack(_path, *settings)
+        return ot.valid, ot.track
+    #The midi is read once for both the key and the parse, as reading a member of a compressed tar is slow
+    with openMidi(_path) as data:
+        key = cache.key(_path, settings, data)
+        entry = cache.get(key)
+        if(entry != None):
+            return entry
+        ot = parseToOneTrack(_path, *settings, data = data)
+    cache.put(key, ot.valid, ot.track)
+    return ot.valid, ot.track
+
+
+#Runs in the worker processes of MidiParser.parse_parallel. Archives stay open until the worker exits
+def _initParseWorker(debugLevel, archives = ()):
+    logger.handlers[0].setLevel(debugLevel)
+    for archive in archives:
+        acquireArchive(archive)
+
+#Returns (<path>, <track or None>, <error or None>) so one bad midi does not kill the whole pool
+def _parseWorker(job):
+    _path, settings, cache = job
+    try:
+        valid, track = _parseToTrack(_path, settings, cache)
+    except Exception as e:
+        return _path, None, "{}: {}".format(type(e).__name__, e)
+    if(not valid):
+        return _path, None, None
+    return _path, track, None
 
 
 
 
 class MidiParser:
-    def __init__(self, noteRange, smallestTimeUnit, convertToC, timeMeasurement, mode = "both", folder = None, debugLevel = logging.ERROR):
+    def __init__(self, noteRange, smallestTimeUnit, convertToC, timeMeasurement, mode = "both", folder = None, debugLevel = logging.ERROR, cache = None, columnar = False, fastReader = False):
         """
         General use parser for midis
 
@@ -77,9 +255,19 @@ class MidiParser:
         timeMeasurement: str -> ["relative", "duration", "by_time_unit"]
             If time of a note should be measured relative to next note or the duration of a note
         folder: str
-            Path of folder with midis
+            Path of folder with midis, or of a zip or tar archive of midis which are read
+            without being extracted
         debugLevel: str -> ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
             Level of verbose, debug being highest, critical being lowest
+        cache: str or ParseCache
+            Folder of (or a) ParseCache. Parsed OneTracks are reused from it as long as neither
+            the midi nor the settings above changed
+        columnar: bool
+            If parsed OneTracks should be NoteArrays instead of lists of notes, or TimeUnitArrays
+            for by_time_unit
+        fastReader: bool
+            If midis should be read straight from their bytes with readMidiNotes instead of
+            mido. Gives the same OneTracks without making a mido message for every event
         """
         self.mode = mode
         logger.handlers[0].setLevel(debugLevel)
@@ -88,8 +276,14 @@ class MidiParser:
         self.timeMeasurement = timeMeasurement
         self.smallestTimeUnit = smallestTimeUnit
         self.convertToC = convertToC
+        self.columnar = columnar
+        self.fastReader = fastReader
+        if(type(cache) == str):
+            cache = ParseCache(cache)
+        self.cache = cache
 
         self.midiPaths = []
+        self.failedMidis = []
         if folder != None:
             self.queueMidis(folder)
         
@@ -105,7 +299,7 @@ class MidiParser:
         Parameters
         ----------
         folder: str
-            Folder at which midi paths will be extracted from
+            Folder or zip or tar archive at which midi paths will be extracted from
         r: bool
             Whether the midi paths should be recursively extracted        
         """
@@ -115,29 +309,102 @@ class MidiParser:
 
 
 
-    def parse(self):
+    def parse(self, workers = None, chunksize = None):
         """
         Parses all queued midis to standard OneTrack
 
+        Parameters
+        ----------
+        workers: int
+            If greater than 1 the midis are parsed in parallel with parse_parallel
+        chunksize: int
+            Number of midis sent to a worker at a time. Only used when parsing in parallel
+
         Returns: List of parsed OneTracks
         """
+        if(workers != None and workers != 1):
+            return self.parse_parallel(workers, chunksize)
+        return list(self.iter_parse())
+
+
+    def iter_parse(self):
+        """
+        Parses queued midis one at a time. Each midi is loaded, flattened and constrained
+        before the next one is read, so only one mido is ever held in memory
+
+        Yields: Parsed OneTrack
+        """
         self.logger.info("Started parsing {} midis".format(len(self.midiPaths)))
         if(len(self.midiPaths)==0):
             self.logger.warning("No midis to be parsed")
 
+        nParsed = 0
+        settings = self._oneTrackSettings()
+        #Archives are closed even if parsing stops early
+        with holdArchives(self.midiPaths):
+            for _path in self.midiPaths:
+                valid, track = _parseToTrack(_path, settings, self.cache)
+                if(valid):
+                    nParsed += 1
+                    yield track
+        self.logger.info("Successfully parsed {} midis".format(nParsed))
+        if(self.cache != None):
+            self.logger.debug("Parse cache has {} hits and {} misses".format(self.cache.hits, self.cache.misses))
+
+
+    def parse_parallel(self, workers = None, chunksize = None):
+        """
+        Parses all queued midis to standard OneTrack using a pool of processes. Each worker
+        loads and flattens its own midis so only the parsed tracks are sent back. Order of
+        the queued midis is preserved. Midis that raise an error are logged and recorded in
+        self.failedMidis as (<path>, <error>) instead of stopping the parse.
+        On Windows the call must be guarded by if __name__ == "__main__"
+
+        Parameters
+        ----------
+        workers: int
+            Number of processes. Defaults to number of cpus
+        chunksize: int
+            Number of midis sent to a worker at a time. Defaults to splitting the queue
+            into about 4 chunks per worker
+
+        Returns: List of parsed OneTracks
+        """
+        if(workers == None):
+            workers = os.cpu_count() or 1
+        if(chunksize == None):
+            chunksize = max(1, len(self.midiPaths)//(workers*4))
+        self.logger.info("Started parsing {} midis with {} workers".format(len(self.midiPaths), workers))
+        if(len(self.midiPaths)==0):
+            self.logger.warning("No midis to be parsed")
+            return []
+
         ots = []
-        self.midos = parseToMidos(self.midiPaths)
-        for _mido in self.midos:
-            ot = OneTrack(_mido, self.noteRange, self.smallestTimeUnit, self.convertToC, self.timeMeasurement, self.mode)
-            if(ot.valid):
-                ots.append(ot.track)
-        self.logger.info("Successfully parsed {} midis".format(len(ots)))
+        self.failedMidis = []
+        settings = self._oneTrackSettings()
+        jobs = [(_path, settings, self.cache) for _path in self.midiPaths]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initParseWorker, initargs=(self.logger.handlers[0].level, findArchives(self.midiPaths))) as pool:
+            for _path, track, error in pool.map(_parseWorker, jobs, chunksize=chunksize):
+                if(error != None):
+                    self.logger.warning("Failed to parse {} ({})".format(_path, error))
+                    self.failedMidis.append((_path, error))
+                elif(track != None):
+                    ots.append(track)
+        #Each worker only counted its own puts, so the limit of the cache is enforced here
+        if(self.cache != None):
+            self.cache.refresh()
+        self.logger.info("Successfully parsed {} midis, {} failed".format(len(ots), len(self.failedMidis)))
         return ots
 
 
+    #Settings passed to OneTrack after the mido
+    def _oneTrackSettings(self):
+        return (self.noteRange, self.smallestTimeUnit, self.convertToC, self.timeMeasurement, self.mode, self.columnar, self.fastReader)
+
+
 
     
-    def serialize(self, fp):
+    def serialize(self, fp, binary = False):
         """
         Writes parsed one tracks to disk
 
@@ -145,11 +412,17 @@ class MidiParser:
         ----------
         fp: str
             folder at which OneTracks will be written to
+        binary: bool
+            If OneTracks should be written with writeParsed instead of pickle. Much
+            smaller and faster to load
         """
         parsed = self.parse()
-        f = open(fp,"wb")
-        pickle.dump(parsed,f)
-        f.close()
+        if(binary):
+            writeParsed(parsed, fp)
+        else:
+            f = open(fp,"wb")
+            pickle.dump(parsed,f)
+            f.close()
         logger.info("Successfully serialized parsed midis at {}".format(fp))
         
 
@@ -157,13 +430,16 @@ class MidiParser:
     @staticmethod
     def deSerialize(fp):
         """
-        As name suggest deserializes pickled OneTracks
+        As name suggest deserializes pickled OneTracks. Files written with binary = True
+        are detected and read with readParsed
 
         Parameters
         ----------
         fp: str
             folder at which OneTracks will be written to
         """
+        if(isBinaryParsed(fp)):
+            return readParsed(fp)
         f = open(fp,"rb")
         parsed = pickle.load(f)
         f.close()
@@ -175,6 +451,8 @@ class MidiParser:
 #Time is assumed to be measured in ticks. A function can convert to seconds and time units depending on tpb
 class Note:
 
+    __slots__ = ("type", "pitch", "time", "velocity", "instrument")
+
     MAX_NOTE = 127
     MIN_NOTE = 0
     NOTES_IN_OCTAVE = 12
@@ -203,10 +481,25 @@ class Note:
         if(velocity==0 and type=="note_on"):
             type = "note_off"
         self.type = type
-        self.pitch = self._noneify(pitch)
-        self.time = self._noneify(time)
-        self.velocity = self._noneify(velocity)
-        self.instrument = self._noneify(instrument)
+        self.pitch = pitch
+        self.time = time
+        self.velocity = velocity
+        self.instrument = instrument
+
+
+    @classmethod
+    def _make(cls, type, time, pitch, instrument, velocity):
+        """
+        Fast constructor used while parsing. Skips __init__ so type must already be
+        note_off for note_ons with a velocity of 0
+        """
+        note = object.__new__(cls)
+        note.type = type
+        note.pitch = pitch
+        note.time = time
+        note.velocity = velocity
+        note.instrument = instrument
+        return note
     
 
     def __iter__(self):
@@ -246,7 +539,7 @@ class Note:
         time: int
             time in relative dt
         """
-        return RelativeNote(self.type, time, pitch = self.pitch, instrument = self.instrument, velocity = self.velocity)
+        return RelativeNote._make(self.type, time, self.pitch, self.instrument, self.velocity)
     
 
     def convertToDurational(self, time):
@@ -256,7 +549,7 @@ class Note:
         time: int
             time in absolute
         """
-        return DurationalNote(self.type, time, pitch = self.pitch, instrument = self.instrument, velocity = self.velocity)
+        return DurationalNote._make(self.type, time, self.pitch, self.instrument, self.velocity)
     
     def convertToAbsolute(self, time):
         """
@@ -265,13 +558,16 @@ class Note:
         time: int
             time in absolute
         """
-        return AbsoluteNote(self.type, time, pitch = self.pitch, instrument = self.instrument, velocity = self.velocity)
+        return AbsoluteNote._make(self.type, time, self.pitch, self.instrument, self.velocity)
 
 
-    def _noneify(self, var):
-        if(var!=None):
-            return var
-        return None
+    def __getstate__(self):
+        return {attr: getattr(self, attr) for attr in Note.__slots__}
+
+    #Also loads notes that were pickled before Note had __slots__
+    def __setstate__(self, state):
+        for attr, value in state.items():
+            setattr(self, attr, value)
 
     def _checkNote(self):
         if(self.pitch>Note.MAX_NOTE):
@@ -288,33 +584,201 @@ class Note:
 
 
 class AbsoluteNote(Note):
-    def __init__(self, type, time, pitch = None, instrument = None, velocity = None):
-        """
-        Note time is measure in absolute ticks
-        """
-        super().__init__(type = type, time = time, pitch = pitch, instrument = instrument, velocity = velocity)
+    """
+    Note time is measure in absolute ticks
+    """
+    __slots__ = ()
 
 class RelativeNote(Note):
-    def __init__(self, type, time, pitch = None, instrument = None, velocity = None):
-        """
-        Note time is measured in dt (change in time in ticks)
-        """
-        super().__init__(type = type, time = time, pitch = pitch, instrument = instrument, velocity = velocity)
+    """
+    Note time is measured in dt (change in time in ticks)
+    """
+    __slots__ = ()
 
 class DurationalNote(Note):
-    def __init__(self, type, time, pitch = None, instrument = None, velocity = None):
-        """
-        Note time is measured in duration (time note is played for in ticks)
-        """
-        super().__init__(type, time, pitch = pitch, instrument = instrument, velocity = velocity)
+    """
+    Note time is measured in duration (time note is played for in ticks)
+    """
+    __slots__ = ()
     
 class ByTimeUnitNote(Note):
+    __slots__ = ()
+
     def __init__(self, type, time = None, pitch = None, instrument = None, velocity = None):
         """
         Note in moment of time. No time 
         """
         super().__init__(type, time = time, pitch = pitch, instrument = instrument, velocity = velocity)
 
+
+
+class NoteArray:
+
+    TYPES = ["time_unit", "note_on", "note_off"]
+    TIME_UNIT = 0
+    NOTE_ON = 1
+    NOTE_OFF = 2
+    #Stands in for None in the pitches, instruments and velocities columns
+    NO_VALUE = -1
+    FIELDS = ["types", "times", "pitches", "instruments", "velocities"]
+
+    def __init__(self, types, times, pitches, instruments, velocities, noteClass = RelativeNote):
+        """
+        Columnar storage of a track of notes. Each attribute of Note is kept in its own
+        numpy array so no Note objects are created while parsing or encoding. Notes are only
+        materialized when the array is indexed or iterated over and are copies, so changing
+        them does not change the array
+
+        Parameters
+        ----------
+        types: array
+            Index of each note type in NoteArray.TYPES
+        times: array
+            Time of each note. Meaning depends on noteClass
+        pitches: array
+            Midi pitch of each note, NoteArray.NO_VALUE for time units
+        instruments: array
+            Channel of each note, NoteArray.NO_VALUE for time units
+        velocities: array
+            Velocity of each note, NoteArray.NO_VALUE for time units
+        noteClass: class
+            Note class that materialized notes will be. RelativeNote or DurationalNote
+        """
+        self.types = np.asarray(types, dtype = np.int8)
+        self.times = np.asarray(times, dtype = np.int64)
+        self.pitches = np.asarray(pitches, dtype = np.int16)
+        self.instruments = np.asarray(instruments, dtype = np.int16)
+        self.velocities = np.asarray(velocities, dtype = np.int16)
+        self.noteClass = noteClass
+
+
+    @staticmethod
+    def fromNotes(notes, noteClass = None):
+        """
+        Parameters
+        ----------
+        notes: list[Note]
+            Track of notes to be stored
+        noteClass: class
+            Defaults to class of first note
+
+        Returns: NoteArray
+        """
+        if(noteClass == None):
+            noteClass = type(notes[0]) if len(notes) > 0 else RelativeNote
+        typeInds = {_type: i for i, _type in enumerate(NoteArray.TYPES)}
+        noValue = lambda var: NoteArray.NO_VALUE if var == None else var
+        return NoteArray(
+            [typeInds[note.type] for note in notes],
+            [note.time for note in notes],
+            [noValue(note.pitch) for note in notes],
+            [noValue(note.instrument) for note in notes],
+            [noValue(note.velocity) for note in notes],
+            noteClass
+        )
+
+
+    def toNotes(self):
+        return list(self)
+
+
+    def __len__(self):
+        return len(self.types)
+
+
+    def __getitem__(self, i):
+        if(isinstance(i, slice)):
+            return NoteArray(self.types[i], self.times[i], self.pitches[i], self.instruments[i], self.velocities[i], self.noteClass)
+        return self._note(self.types[i].item(), self.times[i].item(), self.pitches[i].item(), self.instruments[i].item(), self.velocities[i].item())
+
+
+    def __iter__(self):
+        return map(self.noteClass._make, *self._columnLists())
+
+    #Columns as python lists with None put back in, ready to be passed to Note._make
+    def _columnLists(self):
+        types = np.array(NoteArray.TYPES, dtype = object)[self.types].tolist()
+        optionalColumns = []
+        for column in [self.pitches, self.instruments, self.velocities]:
+            column = column.astype(object)
+            column[column == NoteArray.NO_VALUE] = None
+            optionalColumns.append(column.tolist())
+        return [types, self.times.tolist()] + optionalColumns
+
+
+    def _note(self, _type, time, pitch, instrument, velocity):
+        noValue = NoteArray.NO_VALUE
+        return self.noteClass._make(
+            NoteArray.TYPES[_type], time,
+            None if pitch == noValue else pitch,
+            None if instrument == noValue else instrument,
+            None if velocity == noValue else velocity
+        )
+
+
+class TimeUnitArray:
+
+    def __init__(self, notes, units, nTimeUnits):
+        """
+        Sparse by_time_unit track. Instead of a list for every time unit, most of them empty,
+        the notes are one NoteArray ordered by time unit. The notes of time unit t are
+        notes[offsets[t]:offsets[t+1]]
+
+        Parameters
+        ----------
+        notes: NoteArray
+            Notes of every time unit in order
+        units: array
+            Time unit of each note
+        nTimeUnits: int
+            Number of time units in the track, including empty ones
+        """
+        self.notes = notes
+        self.units = np.asarray(units, dtype = np.int64)
+        self.nTimeUnits = int(nTimeUnits)
+        self.offsets = np.searchsorted(self.units, np.arange(self.nTimeUnits+1))
+
+
+    @staticmethod
+    def fromLists(byTimeUnit):
+        """
+        Parameters
+        ----------
+        byTimeUnit: list[list]
+            by_time_unit track of notes
+
+        Returns: TimeUnitArray
+        """
+        units = np.repeat(np.arange(len(byTimeUnit)), [len(timeUnit) for timeUnit in byTimeUnit])
+        return TimeUnitArray(NoteArray.fromNotes(list(chain.from_iterable(byTimeUnit))), units, len(byTimeUnit))
+
+
+    def toLists(self):
+        return [timeUnit.toNotes() for timeUnit in self]
+
+
+    def nonEmpty(self):
+        """
+        Returns: generator of (<time unit>, <NoteArray of its notes>) for time units with notes
+        """
+        for unit in np.flatnonzero(np.diff(self.offsets)).tolist():
+            yield unit, self[unit]
+
+
+    def __len__(self):
+        return self.nTimeUnits
+
+
+    def __getitem__(self, t):
+        return self.notes[self.offsets[t]:self.offsets[t+1]]
+
+
+    def __iter__(self):
+        return (self[t] for t in range(self.nTimeUnits))
+
+
+
+
 #Implementation is not general. Specifically for the OneTracks.
 class OneTrack:
 
@@ -341,17 +805,20 @@ class OneTrack:
         "B":11
     }
     
-    def __init__(self, mido, noteRange, smallestTimeUnit, convertToC, timeMeasurement, mode = "both", name = None):
+    def __init__(self, mido, noteRange, smallestTimeUnit, convertToC, timeMeasurement, mode = "both", name = None, columnar = False):
         """
         OneTracks automatically perform many functions that decimal encoders need in order to do their encoding.
         As the name suggest the tracks of a midi are flattened to one. 
+        If columnar the track is a NoteArray instead of a list of notes, or a TimeUnitArray
+        for by_time_unit
         """
+        self.columnar = columnar
         self.timeMeasurement = timeMeasurement
         self.mode = mode
         self.minNote, self.maxNote = noteRange
         self.convertToC = convertToC
         try:
-            self.name = mido.tracks[0][0].name
+            self.name = mido.name if isinstance(mido, MidiNotes) else mido.tracks[0][0].name
         except: 
             self.name = name
         self.key = self._extractKeySignature(mido)
@@ -363,7 +830,7 @@ class OneTrack:
         self.valid = self._checkValid()
         if(self.valid):
             self.halfStepsBelowC = 12 - OneTrack.halfStepsAboveC[self.key.replace("m", "")]
-            self.track = self._flatten(mido)
+            self.track = self._flattenArray(mido) if columnar else self._flatten(mido)
             if(len(self.track) < 10):      
                 self.valid == False
                 logger.debug("Piece {} has length of 0".format(self.name))
@@ -381,6 +848,8 @@ class OneTrack:
 
 
     def _extractKeySignature(self, mido):
+        if(isinstance(mido, MidiNotes)):
+            return mido.key
         for track in mido.tracks:
             for msg in track:
                 if(type(msg)==MetaMessage and msg.type == "key_signature"):
@@ -389,28 +858,60 @@ class OneTrack:
 
     #Combines all synchronous tracks together into one track
     def _flatten(self, mido):
-        notes = []
-
-        absoluteTrack = list(itertools.chain.from_iterable([self._convertAbsolute(track) for track in mido.tracks]))
-        absoluteTrack.sort(key = lambda x: x.time)
-
+        absoluteTrack = list(mergeTracks([self._convertAbsolute(track) for track in mido.tracks]))
         relativeTrack = self._convertRelative(absoluteTrack)
         return relativeTrack
     
-    #Takes raw mido
+    #Same as _flatten but straight to a relative NoteArray without creating notes
+    def _flattenArray(self, mido):
+        absoluteTracks = [self._convertAbsoluteArray(track) for track in mido.tracks]
+        columns = [np.concatenate(column) for column in zip(*absoluteTracks)]
+        #The stable sort is timsort which merges the already sorted runs of each track
+        order = np.argsort(columns[1], kind = "stable")
+        types, times, pitches, instruments, velocities = [column[order] for column in columns]
+        return NoteArray(types, np.diff(times, prepend = times[0]), pitches, instruments, velocities, RelativeNote)
+
+    #Takes a track of a raw mido or MidiNotes. Returns absolute columns of the notes in track
+    def _convertAbsoluteArray(self, track):
+        if(isinstance(track, NoteTrack)):
+            types = np.where(track.noteOns & (track.velocities != 0), NoteArray.NOTE_ON, NoteArray.NOTE_OFF)
+            return [column.astype(np.int64) for column in [types, track.times, track.pitches, track.channels, track.velocities]]
+        absoluteTime = 0
+        columns = ([], [], [], [], [])
+        types, times, pitches, instruments, velocities = columns
+        for msg in track:
+            absoluteTime += msg.time
+            if(self._isNote(msg)):
+                types.append(NoteArray.NOTE_ON if msg.type == "note_on" and msg.velocity != 0 else NoteArray.NOTE_OFF)
+                times.append(absoluteTime)
+                pitches.append(msg.note)
+                instruments.append(msg.channel)
+                velocities.append(msg.velocity)
+        return [np.array(column, dtype = np.int64) for column in columns]
+
+    #Takes a track of a raw mido or MidiNotes. Yields the notes in absolute time so the tracks can be merged lazily
     def _convertAbsolute(self, track):
+        if(isinstance(track, NoteTrack)):
+            for noteOn, time, pitch, channel, velocity in zip(*[column.tolist() for column in track]):
+                yield AbsoluteNote._make("note_on" if noteOn and velocity != 0 else "note_off", time, pitch, channel, velocity)
+            return
         absoluteTime = 0
-        absoluteTrack = []
         for msg in track:
             absoluteTime += msg.time
             if(self._isNote(msg)):
-                absoluteTrack.append(AbsoluteNote(msg.type, absoluteTime, msg.note, instrument=msg.channel, velocity=msg.velocity))
-        return absoluteTrack
+                msgType = "note_off" if msg.velocity == 0 else msg.type
+                yield AbsoluteNote._make(msgType, absoluteTime, msg.note, msg.channel, msg.velocity)
 
     #Takes relative track
     def _convertByTimeUnit(self):
         track = self.track
-        totalTimeUnits = sum([self._timeConversion(note) for note in track])+1
+        if(self.columnar):
+            track.times = self._convertTimes(track.times)
+            units = np.cumsum(track.times) - track.times
+            self.track = TimeUnitArray(track, units, track.times.sum()+1)
+            return
+        self._setTimes(track, self._convertTimes(np.array([note.time for note in track], dtype = np.int64)))
+        totalTimeUnits = sum(note.time for note in track)+1
         byTimeUnit = [[] for i in range(totalTimeUnits)]
         currentTimeUnit = 0
         for note in track:
@@ -427,59 +928,142 @@ class OneTrack:
 
 
 
+    #Transposes to C, folds pitches into noteRange and converts ticks to time units for every note at once
     def _applyConstraints(self):
-        if(self.convertToC and self.timeMeasurement!="by_time_unit"):
-            for note in self.track:
-                self._convertToC(note)
-                self._applyNoteRange(note)
-                self._timeConversion(note)
-        if(not self.convertToC and self.timeMeasurement!="by_time_unit"):
-            for note in self.track:
-                self._applyNoteRange(note)
-                self._timeConversion(note)
-
-
-        if(self.convertToC and self.timeMeasurement=="by_time_unit"):
-            for timeUnit in self.track:
-                for note in timeUnit:
-                    self._convertToC(note)
-                    self._applyNoteRange(note)
-
-        if(not self.convertToC and self.timeMeasurement=="by_time_unit"):
-            for timeUnit in self.track:
-                for note in timeUnit:
-                    self._applyNoteRange(note)
-        
-
+        if(self.columnar):
+            track = self.track
+            #By time unit tracks already have their times converted
+            if(self.timeMeasurement == "by_time_unit"):
+                track = track.notes
+            else:
+                track.times = self._convertTimes(track.times)
+            isNote = track.types != NoteArray.TIME_UNIT
+            track.pitches[isNote] = self._constrainPitches(track.pitches[isNote])
+            return
+
+        notes = self.track
+        #By time unit tracks already have their times converted
+        if(self.timeMeasurement == "by_time_unit"):
+            notes = list(chain.from_iterable(self.track))
+        else:
+            self._setTimes(notes, self._convertTimes(np.array([note.time for note in notes], dtype = np.int64)))
+        notes = [note for note in notes if note.type != "time_unit"]
+        pitches = self._constrainPitches(np.array([note.pitch for note in notes], dtype = np.int64))
+        for note, pitch in zip(notes, pitches.tolist()):
+            note.pitch = pitch
+
+    def _constrainPitches(self, pitches):
+        pitches = pitches.astype(np.int64)
+        if(self.convertToC):
+            pitches += self.halfStepsBelowC if self.halfStepsBelowC<=6 else self.halfStepsBelowC - 12
+            self._checkPitches(pitches)
+        above = pitches > self.maxNote
+        below = pitches < self.minNote
+        pitches[above] -= 12 * (((pitches[above]-self.maxNote)//12) + 1)
+        pitches[below] += 12 * (((self.minNote - pitches[below])//12) + 1)
+        self._checkPitches(pitches)
+        return pitches
 
+    #converts ticks to number of time units
+    def _convertTimes(self, times):
+        return np.rint(times*(1/self.tpb)/4/self.smallestTimeUnit).astype(np.int64)
 
+    def _setTimes(self, notes, times):
+        for note, time in zip(notes, times.tolist()):
+            note.time = time
 
-            
+    def _checkPitches(self, pitches):
+        if(len(pitches) == 0):
+            return
+        if(pitches.max()>Note.MAX_NOTE):
+            raise Exception("Note pitch exceeds max midi note of 127")
+        if(pitches.min()<Note.MIN_NOTE):
+            raise Exception("Note pitch exceeds min midi note of 0")
 
 
-    
-        
     #If timeMeasurement is durational 
     def _convertDurational(self):
         """
         Note times are durational.
         """
+        if(self.columnar):
+            self._convertDurationalArray()
+            return
+        track = self.track
+        #Duration of a note_on runs from the time before it to the next note_off of the same pitch
+        durations = [0]*len(track)
+        openNotes = {}
+        currentTime = 0
+        for i, note in enumerate(track):
+            startTime = currentTime
+            currentTime += note.time
+            if(note.type == "note_on"):
+                openNotes.setdefault(note.pitch, []).append((i, startTime))
+            elif(note.type == "note_off" and note.pitch in openNotes):
+                for j, noteStartTime in openNotes.pop(note.pitch):
+                    durations[j] = currentTime - noteStartTime
+        #Notes that are never turned off last until the end of the track
+        for openPitch in openNotes.values():
+            for j, noteStartTime in openPitch:
+                durations[j] = currentTime - noteStartTime
+
         notesTimed = []
-        for i, note in enumerate(self.track):
+        for note, dt in zip(track, durations):
             if(note.time>0):
-                notesTimed.append(DurationalNote("time_unit", note.time))
-            if(note.type == "note_on"):
-                noteNum = note.pitch
-                dt = 0
-                for nextNote in self.track[i:]:
-                    if(nextNote.type == "note_off" and nextNote.pitch == noteNum):
-                        dt+=nextNote.time 
-                        break
-                    dt+=nextNote.time 
-                if(dt>0):
-                    notesTimed.append(note.convertToDurational(dt))
+                notesTimed.append(DurationalNote._make("time_unit", note.time, None, None, None))
+            if(dt>0):
+                notesTimed.append(note.convertToDurational(dt))
         self.track = notesTimed
 
+    #Same output as _convertDurational but for a relative NoteArray
+    def _convertDurationalArray(self):
+        track = self.track
+        n = len(track)
+        durations = self._durations(track.types, track.pitches, track.times)
+        hasTimeUnit = track.times > 0
+        hasNote = (track.types == NoteArray.NOTE_ON) & (durations > 0)
+        noValue = np.full(n, NoteArray.NO_VALUE)
+
+        #Every note can become a time unit followed by a note_on. Interleave them then drop the ones that do not exist
+        interleave = lambda timeUnitColumn, noteColumn: np.stack([timeUnitColumn, noteColumn], axis = 1).reshape(-1)
+        keep = interleave(hasTimeUnit, hasNote)
+        self.track = NoteArray(
+            interleave(np.full(n, NoteArray.TIME_UNIT), track.types)[keep],
+            interleave(track.times, durations)[keep],
+            interleave(noValue, track.pitches)[keep],
+            interleave(noValue, track.instruments)[keep],
+            interleave(noValue, track.velocities)[keep],
+            DurationalNote
+        )
+
+    @staticmethod
+    def _durations(types, pitches, times):
+        """
+        Duration in ticks of every note_on of a relative track. Same as _convertDurational, the
+        duration runs from the time before the note_on to the first following note_off of the same
+        pitch, or to the end of the track if there is none. Other notes get 0
+
+        Returns: array of durations
+        """
+        n = len(types)
+        ends = np.cumsum(times)
+        starts = ends - times
+
+        #Group notes by pitch keeping track order inside each group, then find the next note_off in the group
+        order = np.lexsort((np.arange(n), pitches))
+        sortedPitches = pitches[order]
+        groupEnds = np.searchsorted(sortedPitches, sortedPitches, side = "right")
+        offPositions = np.where(types[order] == NoteArray.NOTE_OFF, np.arange(n), n)
+        nextOff = np.minimum.accumulate(np.append(offPositions[1:], n)[::-1])[::-1]
+        matched = nextOff < groupEnds
+
+        sortedEnds = np.full(n, ends[-1] if n > 0 else 0)
+        sortedEnds[matched] = ends[order[nextOff[matched]]]
+        durations = np.zeros(n, dtype = np.int64)
+        durations[order] = sortedEnds - starts[order]
+        durations[types != NoteArray.NOTE_ON] = 0
+        return durations
+
 
 
     def _checkValid(self):
@@ -494,27 +1078,6 @@ class OneTrack:
             return False
         return True
 
-    def _convertToC(self, note):
-        if(note.type!="time_unit"):
-            note.transpose(self.halfStepsBelowC if self.halfStepsBelowC<=6 else self.halfStepsBelowC - 12)
-        
-    def _applyNoteRange(self, note):
-        if(note.type!="time_unit"):
-            if(note.pitch>self.maxNote):
-                octavesToShift = (((note.pitch-self.maxNote)//12) + 1)
-                note.transpose(-12 * octavesToShift)
-            elif(note.pitch<self.minNote):
-                octavesToShift = (((self.minNote - note.pitch)//12) + 1)
-                note.transpose(12 * octavesToShift)
-    
-    #converts ticks to number of time units
-    def _timeConversion(self, note):
-        converted = note.time*(1/self.tpb)/4/self.smallestTimeUnit
-        if(converted>0 and converted<1):
-            note.time = 1
-        note.time = round(converted)
-        return note.time
-
 
     def _isNote(self,msg):
         return (type(msg) != MetaMessage and msg.type in ["note_on", "note_off"])
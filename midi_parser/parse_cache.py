@@ -0,0 +1,148 @@
+#On disk cache of parsed OneTracks so midis are only parsed again when they or the parser settings change
+
+import hashlib
+import os
+import pickle
+from .midi_io import openMidi
+
+
+
+
+class ParseCache:
+
+    #Bump when the parsed OneTrack format changes so old entries are no longer reused
+    VERSION = 1
+    EXTENSION = ".pkl"
+    #Eviction deletes down to this fraction of maxBytes so the next puts do not evict again straight away
+    LOW_WATER = 0.9
+
+    def __init__(self, folder, maxBytes = 2**30):
+        """
+        Content addressed cache of parsed OneTracks. Each entry is keyed by the hash of the
+        midi file bytes and the hash of the parser settings, so an edited midi or a change to
+        noteRange, smallestTimeUnit, convertToC, timeMeasurement or mode simply misses.
+        Stale entries are removed by the least recently used eviction once the cache grows
+        past maxBytes, down to LOW_WATER of maxBytes.
+
+        Parameters
+        ----------
+        folder: str
+            Folder the cached OneTracks are written to. Created if it does not exist
+        maxBytes: int
+            Maximum total size of the cache on disk
+        """
+        self.folder = folder
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(folder, exist_ok=True)
+        self.nBytes = sum(size for _, size, _ in self._entries())
+
+
+    def key(self, _path, settings, data = None):
+        """
+        Parameters
+        ----------
+        _path: str
+            Path of midi, which can be in an archive
+        settings: tuple
+            Settings the OneTrack is parsed with
+        data: bytes-like
+            Bytes of the midi if it is already open, so it is not read again
+
+        Returns: str key of the midi under the settings
+        """
+        if(data == None):
+            with openMidi(_path) as data:
+                fileHash = hashlib.sha1(data)
+        else:
+            fileHash = hashlib.sha1(data)
+        settingsHash = hashlib.sha1(repr((ParseCache.VERSION, settings)).encode())
+        return fileHash.hexdigest() + "_" + settingsHash.hexdigest()[:16]
+
+
+    def get(self, key):
+        """
+        Returns: (<valid>, <track>) of the cached OneTrack or None if it is not cached
+        """
+        fp = self._entryPath(key)
+        try:
+            with open(fp, "rb") as f:
+                entry = pickle.load(f)
+            os.utime(fp)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+
+    def put(self, key, valid, track):
+        """
+        Writes a parsed OneTrack to the cache and evicts the least recently used entries
+        if the cache is over maxBytes
+        """
+        fp = self._entryPath(key)
+        tmp = "{}.{}.tmp".format(fp, os.getpid())
+        with open(tmp, "wb") as f:
+            pickle.dump((valid, track), f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.nBytes += os.path.getsize(tmp)
+        try:
+            self.nBytes -= os.path.getsize(fp)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp, fp)
+        if(self.nBytes > self.maxBytes):
+            self.evict()
+
+
+    def evict(self):
+        """
+        Deletes least recently used entries until the cache fits in LOW_WATER of maxBytes
+        """
+        entries = sorted(self._entries(), key = lambda entry: entry[2])
+        self.nBytes = sum(size for _, size, _ in entries)
+        for fp, size, _ in entries:
+            if(self.nBytes <= self.maxBytes*ParseCache.LOW_WATER):
+                break
+            try:
+                os.remove(fp)
+            except FileNotFoundError:
+                pass
+            self.nBytes -= size
+
+
+    def refresh(self):
+        """
+        Counts the size of the cache on disk again, for when other processes have written to
+        it, and evicts if it is over maxBytes
+        """
+        self.nBytes = sum(size for _, size, _ in self._entries())
+        if(self.nBytes > self.maxBytes):
+            self.evict()
+
+
+    def clear(self):
+        for fp, _, _ in self._entries():
+            os.remove(fp)
+        self.nBytes = 0
+
+
+    def __len__(self):
+        return len(self._entries())
+
+
+    def _entryPath(self, key):
+        return os.path.join(self.folder, key + ParseCache.EXTENSION)
+
+    #(<path>, <size>, <last used>) of every cached OneTrack
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.folder):
+            if(entry.name.endswith(ParseCache.EXTENSION)):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
@@ -0,0 +1,201 @@
+#Reads the notes of a standard midi file straight from its bytes without building mido messages
+
+from collections import namedtuple
+import struct
+import numpy as np
+from mido import KeySignatureError
+
+
+
+
+#Same table mido decodes key_signature meta messages with, keyed by (<sharps or -flats>, <1 if minor>)
+KEYS = {}
+for _sharps, (_major, _minor) in enumerate(zip(
+        ["Cb", "Gb", "Db", "Ab", "Eb", "Bb", "F", "C", "G", "D", "A", "E", "B", "F#", "C#"],
+        ["Abm", "Ebm", "Bbm", "Fm", "Cm", "Gm", "Dm", "Am", "Em", "Bm", "F#m", "C#m", "G#m", "D#m", "A#m"]), -7):
+    KEYS[(_sharps, 0)] = _major
+    KEYS[(_sharps, 1)] = _minor
+
+#Number of data bytes after each system status byte that can appear in a track. Meta (0xff) and sysex (0xf0, 0xf7) have a length instead
+SYSTEM_DATA_BYTES = {0xf1: 1, 0xf2: 2, 0xf3: 1, 0xf6: 0, 0xf8: 0, 0xfa: 0, 0xfb: 0, 0xfc: 0, 0xfe: 0}
+
+META = 0xff
+META_TRACK_NAME = 0x03
+META_KEY_SIGNATURE = 0x59
+
+
+#Columns of the note_on and note_off messages of a track, times are absolute in ticks
+NoteTrack = namedtuple("NoteTrack", ["noteOns", "times", "pitches", "channels", "velocities"])
+
+
+
+
+class MidiNotes:
+    def __init__(self, tracks, ticksPerBeat, key = None, name = None, trackNames = None):
+        """
+        The parts of a midi file that OneTrack uses. Stands in for a mido MidiFile, so
+        it has tracks and ticks_per_beat like one
+
+        Parameters
+        ----------
+        tracks: list[NoteTrack]
+            Notes of each track of the file
+        ticksPerBeat: int
+            Ticks per beat of the file header
+        key: str
+            Key of the first key_signature of the file, like mido names it. None if there is none
+        name: str
+            Name of the midi, usually its path
+        trackNames: list[str]
+            Name of the first track_name of each track, None for tracks without one
+        """
+        self.tracks = tracks
+        self.ticks_per_beat = ticksPerBeat
+        self.key = key
+        self.name = name
+        self.trackNames = trackNames if trackNames != None else [None]*len(tracks)
+
+
+
+
+def readMidiNotes(data, name = None):
+    """
+    Scans the chunks of a standard midi file keeping only note_on and note_off messages, the
+    first key_signature, track names and ticks per beat. Delta times, running status, sysex and
+    meta messages are handled like mido does, and the same errors as mido are raised for
+    broken files, but no message objects are made
+
+    Parameters
+    ----------
+    data: bytes-like
+        Contents of the file. Anything that can be sliced into bytes and indexed into ints,
+        like bytes, a memoryview or an mmap
+    name: str
+        Name of the midi, usually its path
+
+    Returns: MidiNotes
+    """
+    #Released on return so an mmap passed in can be closed even if reading failed
+    with memoryview(data) as view:
+        return _readMidiNotes(view, name)
+
+
+def _readMidiNotes(data, name):
+    chunkName, headerSize = _readChunkHeader(data, 0)
+    if(chunkName != b"MThd"):
+        raise OSError("MThd not found. Probably not a MIDI file")
+    if(headerSize < 6 or len(data) < 14):
+        raise EOFError
+    _, nTracks, ticksPerBeat = struct.unpack(">hhh", data[8:14])
+    pos = 8 + headerSize
+
+    tracks, trackNames = [], []
+    key = None
+    for _ in range(nTracks):
+        chunkName, size = _readChunkHeader(data, pos)
+        if(chunkName != b"MTrk"):
+            raise OSError("no MTrk header at start of track")
+        pos += 8
+        track, trackKey, trackName = _readTrack(data, pos, pos + size)
+        tracks.append(track)
+        trackNames.append(trackName)
+        if(key == None):
+            key = trackKey
+        pos += size
+    return MidiNotes(tracks, ticksPerBeat, key, name, trackNames)
+
+
+def _readChunkHeader(data, pos):
+    if(len(data) - pos < 8):
+        raise EOFError
+    return struct.unpack(">4sL", data[pos:pos+8])
+
+
+#Returns (<NoteTrack>, <first key>, <first track name>) of the track chunk in data[pos:end]
+def _readTrack(data, pos, end):
+    noteOns, times, pitches, channels, velocities = [], [], [], [], []
+    key = None
+    name = None
+    time = 0
+    lastStatus = None
+    try:
+        while(pos < end):
+            byte = data[pos]
+            pos += 1
+            delta = byte & 0x7f
+            while(byte >= 0x80):
+                byte = data[pos]
+                pos += 1
+                delta = (delta << 7) | (byte & 0x7f)
+            time += delta
+
+            status = data[pos]
+            if(status < 0x80):
+                if(lastStatus == None):
+                    raise OSError("running status without last_status")
+                status = lastStatus
+            else:
+                pos += 1
+                if(status != META):
+                    lastStatus = status
+
+            if(status < 0xf0):
+                kind = status & 0xf0
+                nDataBytes = 1 if kind == 0xc0 or kind == 0xd0 else 2
+                if(pos + nDataBytes > len(data)):
+                    raise EOFError
+                if(data[pos] > 127 or (nDataBytes == 2 and data[pos+1] > 127)):
+                    raise OSError("data byte must be in range 0..127")
+                if(kind == 0x90 or kind == 0x80):
+                    noteOns.append(kind == 0x90)
+                    times.append(time)
+                    pitches.append(data[pos])
+                    channels.append(status & 0x0f)
+                    velocities.append(data[pos+1])
+                pos += nDataBytes
+            elif(status == META):
+                metaType = data[pos]
+                length, pos = _readVarInt(data, pos + 1)
+                if(pos + length > len(data)):
+                    raise EOFError
+                if(metaType == META_KEY_SIGNATURE):
+                    sharps, minor = data[pos], data[pos+1]
+                    sharps = sharps - 256 if sharps > 127 else sharps
+                    if((sharps, minor) not in KEYS):
+                        raise KeySignatureError("Could not decode key with {} flats and mode {}".format(sharps, minor))
+                    if(key == None):
+                        key = KEYS[(sharps, minor)]
+                elif(metaType == META_TRACK_NAME and name == None):
+                    name = bytes(data[pos:pos+length]).decode("latin1")
+                pos += length
+            elif(status == 0xf0 or status == 0xf7):
+                length, pos = _readVarInt(data, pos)
+                if(pos + length > len(data)):
+                    raise EOFError
+                pos += length
+            elif(status in SYSTEM_DATA_BYTES):
+                pos += SYSTEM_DATA_BYTES[status]
+            else:
+                raise OSError("undefined status byte 0x{:02x}".format(status))
+    except IndexError:
+        raise EOFError
+
+    track = NoteTrack(
+        np.array(noteOns, dtype = bool),
+        np.array(times, dtype = np.int64),
+        np.array(pitches, dtype = np.uint8),
+        np.array(channels, dtype = np.uint8),
+        np.array(velocities, dtype = np.uint8)
+    )
+    return track, key, name
+
+
+#Returns (<value>, <position after it>) of the variable length quantity at data[pos]
+def _readVarInt(data, pos):
+    value = 0
+    while(True):
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7f)
+        if(byte < 0x80):
+            return value, pos
@@ -2,7 +2,10 @@ from midi_parser.midi_parser import MidiParser
 from unittest import TestCase
 import numpy
 from midi_parser.pieces import OnOffPiece, MultiNetPiece
-from midi_parser.data_generators import DataGenEmbeddedOnOffNet, DataGenGuideNet, DataGenMiniBachStyle, DataGenOnOffNet, DataGenMultiNet, DataGenEmbeddedMultiNet, DataGen
+import multiprocessing
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from midi_parser.data_generators import _initPrefetchWorker, _prefetchBatch, DataGenEmbeddedOnOffNet, DataGenGuideNet, DataGenMiniBachStyle, DataGenOnOffNet, DataGenMultiNet, DataGenEmbeddedMultiNet, DataGen, PrefetchDataGen
 from midi_parser.decimal_encoders import DecimalEncoderMiniBachStyle, DecimalEncoderOnOff, DecimalEncoderMultiNet
 
 
@@ -43,7 +46,40 @@ class TestDataGeneratorOnOff(TestCase):
         piece = OnOffPiece(datagen.ohe.inverse_transform(data[0][0]).reshape(-1).tolist(), 1/64)
         piece.play()
 
+class TestDataGeneratorIndices(TestCase):
+    def test_indices(self):
+        pieces = [list(range(length)) for length in [0, 3, 12, 13, 14, 40, 1, 27]]
+        for lookback, gap in [(10, 1), (10, 3), (2, 5)]:
+            datagen = DataGenEmbeddedOnOffNet(pieces, 4, lookback, gap)
+            expected = [(p, i) for p, piece in enumerate(pieces) for i in range(len(piece)) if i%gap == 0 and (i+1) < len(piece)-lookback]
+            pieceInds, sampleInds = datagen._getSampleStarts(numpy.sort(datagen.indices))
+            self.assertEqual(list(zip(pieceInds.tolist(), sampleInds.tolist())), expected)
+
+class TestDataGeneratorSplit(TestCase):
+    def test_split_by_piece(self):
+        datagen = DataGenEmbeddedMultiNet(encodedMultiNet, 32, 100, 5)
+        nSamples = len(datagen.indices)
+        valDatagen = datagen.validationSplit(0.25, seed = 1)
+        self.assertEqual(len(valDatagen.encodedMidis), int(0.25*len(encodedMultiNet)))
+        self.assertEqual(len(datagen.encodedMidis) + len(valDatagen.encodedMidis), len(encodedMultiNet))
+        self.assertEqual(len(datagen.indices) + len(valDatagen.indices), nSamples)
+        self.assertIs(valDatagen.encodedMidis.tokens, datagen.encodedMidis.tokens)
+        self.assertIs(valDatagen.ohe, datagen.ohe)
+        self.assertEqual(set(datagen.encodedMidis.starts.tolist()) & set(valDatagen.encodedMidis.starts.tolist()), set())
+        sameSplit = DataGenEmbeddedMultiNet(encodedMultiNet, 32, 100, 5).validationSplit(0.25, seed = 1)
+        numpy.testing.assert_array_equal(sameSplit.encodedMidis.starts, valDatagen.encodedMidis.starts)
+        assertBatchesEqual(valDatagen[0], sameSplit[0])
+
 class TestDataGeneratorEmbeddedOnOffNet(TestCase):
+    def test_sparse(self):
+        numpy.random.seed(0)
+        x, y = DataGenEmbeddedOnOffNet(encoded, 32, 100, 5)[0]
+        numpy.random.seed(0)
+        sparseX, sparseY = DataGenEmbeddedOnOffNet(encoded, 32, 100, 5, sparse = True)[0]
+        numpy.testing.assert_array_equal(x, sparseX)
+        numpy.testing.assert_array_equal(y.argmax(axis = -1), sparseY)
+
+
     def test_init(self):
         datagen = DataGenEmbeddedOnOffNet(encoded, 32, 100, 5)
         
@@ -77,6 +113,25 @@ class TestDataGeneratorMultiNet(TestCase):
         datagen = DataGenMultiNet(encodedMultiNet,  32, 100, 5)
         data = datagen.__getitem__(0)
 
+    def test_encode_matches_sklearn(self):
+        datagen = DataGenEmbeddedMultiNet(encodedMultiNet,  32, 100, 5)
+        xEncodedSamples, yEncodedSamples = datagen._getXYEncodedSamples(*datagen._getXYIndexStarts(datagen._getBatchIndices(0)))
+        np.testing.assert_array_equal(datagen._oneHot(xEncodedSamples), np.array([datagen.ohe.fit_transform(sample) for sample in xEncodedSamples]))
+        np.testing.assert_array_equal(datagen._ordinal(xEncodedSamples), np.array([datagen.ordEnc.fit_transform(sample) for sample in xEncodedSamples]))
+        np.testing.assert_array_equal(datagen._oneHot(yEncodedSamples), datagen.ohe.fit_transform(yEncodedSamples))
+        with self.assertRaises(ValueError):
+            datagen._oneHot(np.array([[datagen.ranges[0][-1]+1, datagen.ranges[1][0]]]))
+
+    def test_sparse(self):
+        for DataGenClass in [DataGenMultiNet, DataGenEmbeddedMultiNet, DataGenGuideNet]:
+            numpy.random.seed(0)
+            dense = DataGenClass(encodedMultiNet,  32, 100, 5)[0]
+            numpy.random.seed(0)
+            sparse = DataGenClass(encodedMultiNet,  32, 100, 5, sparse = True)[0]
+            for denseY, sparseY in zip(dense[1], sparse[1]):
+                self.assertEqual(sparseY.dtype, np.int32)
+                np.testing.assert_array_equal(denseY.argmax(axis = -1), sparseY)
+
     def test_play_sample(self):
         mp = MidiParser((46, 84), 1/32, True, "durational", folder="test/test_data/midis/Bwv768 Chorale and Variations", debugLevel="DEBUG")
         parsed = mp.parse()
@@ -178,10 +233,112 @@ class TestDataGeneratorMiniBach(TestCase):
         encoder = DecimalEncoderMiniBachStyle(mp.parse())
         datagen = DataGenMiniBachStyle(encoder.encode(), 32, 30, 5)
         print(datagen[0])
+
+    def test_multi_hot(self):
+        mp = MidiParser((46, 84), 1/64, True, "by_time_unit", "both", "test/test_data/midis/Bwv768 Chorale and Variations", "DEBUG")
+        encoded = DecimalEncoderMiniBachStyle(mp.parse()).encode()
+        datagen = DataGenMiniBachStyle(encoded, 32, 30, 5)
+        x, y = datagen[0]
+        self.assertEqual(x.shape, (32, 30*len(datagen.ranges)))
+        pieceInds, sampleInds = datagen._getSampleStarts(datagen._getBatchIndices(0))
+        expectedX = np.stack([datagen.mlb.fit_transform(encoded[p][i:i+30]).reshape(-1) for p, i in zip(pieceInds, sampleInds)])
+        expectedY = datagen.mlb.fit_transform([encoded[p][i+30] for p, i in zip(pieceInds, sampleInds)])
+        np.testing.assert_array_equal(x, expectedX)
+        np.testing.assert_array_equal(y, expectedY)
+
+    def test_integer_coded(self):
+        mp = MidiParser((46, 84), 1/64, True, "by_time_unit", "both", "test/test_data/midis/Bwv768 Chorale and Variations", "DEBUG")
+        encoder = DecimalEncoderMiniBachStyle(mp.parse())
+        datagen = DataGenMiniBachStyle(encoder.encode(), 32, 30, 5)
+        integerDatagen = DataGenMiniBachStyle(encoder.encodeIntegers(), 32, 30, 5)
+        self.assertEqual(sorted(datagen.ranges), sorted(integerDatagen.ranges))
+        self.assertEqual(dict(zip(datagen.ranges, datagen.frequencies[0].tolist())), dict(zip(integerDatagen.ranges, integerDatagen.frequencies[0].tolist())))
+        integerDatagen.indices = datagen.indices.copy()
+        for i in [0, len(datagen)-1]:
+            (x, y), (integerX, integerY) = datagen[i], integerDatagen[i]
+            for rows, integerRows in [(y, integerY), (x.reshape(-1, len(datagen.ranges)), integerX.reshape(-1, len(datagen.ranges)))]:
+                self.assertEqual([set(labels) for labels in datagen.mlb.inverse_transform(rows)], [set(labels) for labels in integerDatagen.mlb.inverse_transform(integerRows)])
         
 
 
 
 
 
-        
\ No newline at end of file
+        
+
+
+def assertBatchesEqual(batch, expected):
+    if(isinstance(expected, (list, tuple))):
+        for b, e in zip(batch, expected):
+            assertBatchesEqual(b, e)
+    else:
+        numpy.testing.assert_array_equal(batch, expected)
+
+
+class TestPrefetchDataGen(TestCase):
+
+    def test_same_batches(self):
+        for processes in [False, True]:
+            datagen = DataGenGuideNet(encodedMultiNet, 32, 100, 5)
+            expected = DataGenGuideNet(encodedMultiNet, 32, 100, 5)
+            expected.indices = datagen.indices.copy()
+            prefetched = PrefetchDataGen(datagen, workers = 2, queueSize = 3, processes = processes)
+            for i in list(range(len(prefetched))) + [2, 0]:
+                assertBatchesEqual(prefetched[i], expected[i])
+            self.assertLessEqual(len(prefetched.futures), 3)
+            prefetched.on_epoch_end()
+            expected.indices = datagen.indices.copy()
+            for i in range(len(prefetched)):
+                assertBatchesEqual(prefetched[i], expected[i])
+            prefetched.close()
+
+
+    def test_pickle(self):
+        datagen = DataGenEmbeddedMultiNet(encodedMultiNet, 32, 100, 5)
+        unpickled = pickle.loads(pickle.dumps(datagen))
+        numpy.testing.assert_array_equal(unpickled.indices, datagen.indices)
+        assertBatchesEqual(unpickled[0], datagen[0])
+
+
+    #Processes started with spawn, the default on Windows and macOS, get a pickled copy of the generator
+    def test_spawn(self):
+        datagen = DataGenEmbeddedMultiNet(encodedMultiNet, 32, 100, 5)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(1, mp_context = context, initializer = _initPrefetchWorker, initargs = (datagen,)) as pool:
+            assertBatchesEqual(pool.submit(_prefetchBatch, datagen._getBatchIndices(0)).result(), datagen[0])
+
+
+    def test_seed(self):
+        epochs = []
+        for _ in range(2):
+            prefetched = PrefetchDataGen(DataGenEmbeddedMultiNet(encodedMultiNet, 32, 100, 5), seed = 3)
+            epochs.append([prefetched[0], prefetched[len(prefetched)-1]])
+            prefetched.on_epoch_end()
+            epochs[-1].append(prefetched[0])
+            prefetched.close()
+        assertBatchesEqual(epochs[0], epochs[1])
+        self.assertEqual(prefetched.nClassesNotes, len(prefetched.datagen.ranges[0]))
+
+
+class TestDataGenExport(TestCase):
+
+    def test_iter_batches(self):
+        datagen = DataGenMultiNet(encodedMultiNet, 32, 100, 5)
+        expected = DataGenMultiNet(encodedMultiNet, 32, 100, 5)
+        expected.indices = datagen.indices.copy()
+        datagen.random, expected.random = numpy.random.RandomState(0), numpy.random.RandomState(0)
+        batches = list(datagen.iterBatches(epochs = 2))
+        self.assertEqual(len(batches), 2*len(datagen))
+        assertBatchesEqual(batches[0], expected[0])
+        expected.on_epoch_end()
+        assertBatchesEqual(batches[len(datagen)], expected[0])
+
+
+    def test_tf_dataset(self):
+        datagen = DataGenGuideNet(encodedMultiNet, 32, 100, 5)
+        batches = list(datagen.toTfDataset(shuffle = False).as_numpy_iterator())
+        self.assertEqual(len(batches), len(datagen))
+        for i in [0, len(batches)-1]:
+            assertBatchesEqual(batches[i], datagen.getBatch(numpy.arange(i*32, (i+1)*32)))
+        shuffled = [list(DataGenGuideNet(encodedMultiNet, 32, 100, 5).toTfDataset(seed = 2).take(2).as_numpy_iterator()) for _ in range(2)]
+        assertBatchesEqual(shuffled[0], shuffled[1])
@@ -1,4 +1,4 @@
-from midi_parser.midi_parser import MidiParser
+from midi_parser.midi_parser import MidiParser, DurationalNote
 from unittest import TestCase
 import unittest
 from midi_parser.decimal_encoders import DecimalEncoderMiniBachStyle, DecimalEncoderOnOff, DecimalEncoderMultiNet
@@ -7,6 +7,37 @@ from midi_parser.pieces import MultiNetPiece, OnOffPiece
 
 
 
+#DecimalEncoderOnOff._order before it was vectorized, kept to check the new one against
+def orderLoop(oneEncoded):
+    pointer = 0
+    ordered = []
+    while pointer<len(oneEncoded):
+        curStream = []
+        while pointer<len(oneEncoded) and oneEncoded[pointer]<300:
+            curStream.append(oneEncoded[pointer])
+            pointer+=1
+        if(pointer<len(oneEncoded)):
+            curStream.append(oneEncoded[pointer])
+        ordered.extend(sorted(list(set(curStream))))
+        pointer+=1
+    return ordered
+
+
+#DecimalEncoderMultiNet._encodeOne before it was a grouped sort, kept to check the new one against
+def encodeMultiNetInsert(events):
+    encoded = []
+    for i,note in enumerate(events):
+        if(i>0 and note[0]==300 and encoded[-1][0]==300):
+            encoded[-1][1]+=note[1]
+            continue
+        searchInd = 0
+        lastInd = len(encoded)-1
+        while(lastInd-searchInd>=0 and note[0] < encoded[lastInd-searchInd][0] and encoded[lastInd-searchInd][0]!=300):
+            searchInd += 1
+        if(lastInd-searchInd>=0 and note[0] == encoded[lastInd-searchInd][0]):
+            continue
+        encoded.insert(lastInd+1 - searchInd, note)
+    return encoded
     
 
 class TestDecimalEncoderOnOff(TestCase):
@@ -29,6 +60,21 @@ class TestDecimalEncoderOnOff(TestCase):
             for note in piece:
                 self.assertGreater(350, note)
 
+    def test_encode_columnar(self):
+        mp = MidiParser((46, 84), 1/32, True, "relative", folder = "test/test_data/midis/Bwv768 Chorale and Variations", debugLevel="DEBUG")
+        encoded = DecimalEncoderOnOff(mp.parse(), 100).encode()
+        mp.columnar = True
+        encodedColumnar = DecimalEncoderOnOff(mp.parse(), 100).encode()
+        self.assertEqual(encoded, encodedColumnar)
+
+    def test_order_regression(self):
+        parsed = MidiParser((46, 84), 1/32, True, "relative", folder = "test/test_data/midis/Bwv768 Chorale and Variations").parse()
+        encoder = DecimalEncoderOnOff(parsed, 100)
+        random = np.random.RandomState(0)
+        streams = [[], [300], [60, 60, 210], [301, 60, 55, 60, 300, 300, 70]] + [random.randint(0, 320, size).tolist() for size in [5, 50, 500]]
+        for stream in streams:
+            self.assertEqual(encoder._order(stream), orderLoop(stream))
+
     def test_play(self):
         mp = MidiParser((46, 84), 1/128, True, "relative", folder = "test/test_data/midis/Bwv768 Chorale and Variations", debugLevel="DEBUG")
         parsed = mp.parse()
@@ -55,6 +101,25 @@ class TestDecimalEncoderMultiNet(TestCase):
         print(encoder.encode()[0])
 
 
+    def test_encode_regression(self):
+        encoder = DecimalEncoderMultiNet(MidiParser.deSerialize("test/test_data/serialized_durational"), 100)
+        random = np.random.RandomState(0)
+        pieces = [[], [[300, 2]], [[300, 1], [300, 4], [60, 3], [55, 1], [60, 2], [300, 2], [300, 2], [70, 1]]]
+        for size in [5, 50, 500]:
+            pitches = np.where(random.rand(size) < 0.3, 300, random.randint(50, 60, size))
+            pieces.append(np.stack([pitches, random.randint(0, 10, size)], axis = 1).tolist())
+        pieces = [[DurationalNote._make("time_unit" if pitch == 300 else "note_on", time, None if pitch == 300 else pitch, 0, 100) for pitch, time in piece] for piece in pieces]
+        for piece in pieces + encoder.parsedMidis:
+            self.assertEqual(encoder._encodeOne(piece), encodeMultiNetInsert(encoder._encodeEvents(piece)))
+
+    def test_encode_columnar(self):
+        mp = MidiParser((46, 84), 1/32, True, "durational", folder = "test/test_data/midis/Bwv768 Chorale and Variations", debugLevel="DEBUG")
+        encoded = DecimalEncoderMultiNet(mp.parse(), 100).encode()
+        mp.columnar = True
+        encodedColumnar = DecimalEncoderMultiNet(mp.parse(), 100).encode()
+        self.assertEqual(encoded, encodedColumnar)
+
+
     def test_play(self):
         mp = MidiParser((46, 84), 1/32, True, "durational", "both", "test/test_data/midis/Bwv768 Chorale and Variations", "DEBUG")
         parsed = mp.parse()
@@ -77,6 +142,24 @@ class TestDecimalEncoderMiniBachStyle(TestCase):
         encoder = DecimalEncoderMiniBachStyle(mp.parse())
         print(encoder.encode()[0])
 
+    def test_encode_integers(self):
+        mp = MidiParser((46, 84), 1/64, True, "by_time_unit", "both", "test/test_data/midis/Bwv768 Chorale and Variations", "DEBUG")
+        encoder = DecimalEncoderMiniBachStyle(mp.parse())
+        encodedIntegers = encoder.encodeIntegers()
+        encoded = encoder.encode()
+        for (codes, offsets), piece in zip(encodedIntegers, encoded):
+            self.assertEqual(codes.dtype, np.int16)
+            self.assertEqual(len(offsets), len(piece)+1)
+            self.assertEqual(DecimalEncoderMiniBachStyle.decodeIntegers(codes, offsets), piece)
+        mp.columnar = True
+        columnarEncoder = DecimalEncoderMiniBachStyle(mp.parse())
+        self.assertEqual(columnarEncoder.encode(), encoded)
+        for (codes, offsets), (columnarCodes, columnarOffsets) in zip(encodedIntegers, columnarEncoder.encodeIntegers()):
+            np.testing.assert_array_equal(codes, columnarCodes)
+            np.testing.assert_array_equal(offsets, columnarOffsets)
+        for label in ["none", "note_on_60", "note_off_60", "note_on_127", "note_off_0"]:
+            self.assertEqual(DecimalEncoderMiniBachStyle.codeToLabel(DecimalEncoderMiniBachStyle.labelToCode(label)), label)
+
 
 
         
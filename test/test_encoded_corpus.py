@@ -0,0 +1,94 @@
+from unittest import TestCase
+import pickle
+import shutil
+import tempfile
+import numpy as np
+from midi_parser.midi_parser import MidiParser
+from midi_parser.decimal_encoders import DecimalEncoderOnOff, DecimalEncoderMultiNet
+from midi_parser.data_generators import DataGenEmbeddedMultiNet
+from midi_parser.encoded_corpus import EncodedCorpus
+
+
+bachFolder = "test/test_data/midis/Bwv768 Chorale and Variations"
+encodedOnOff = DecimalEncoderOnOff(MidiParser((46,84), 1/32, True, "relative", folder = bachFolder).parse(), 100).encode()
+encodedMultiNet = DecimalEncoderMultiNet(MidiParser((46,84), 1/32, True, "durational", folder = bachFolder).parse(), 100).encode()
+
+
+class TestEncodedCorpus(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+
+    def test_save_open(self):
+        for encoded in [encodedOnOff, encodedMultiNet]:
+            EncodedCorpus.fromEncoded(encoded).save(self.folder)
+            corpus = EncodedCorpus.open(self.folder)
+            self.assertIsInstance(corpus.tokens, np.memmap)
+            self.assertEqual(len(corpus), len(encoded))
+            self.assertEqual([piece.tolist() for piece in corpus], encoded)
+
+
+    def test_views(self):
+        EncodedCorpus.fromEncoded(encodedMultiNet).save(self.folder)
+        corpus = EncodedCorpus.open(self.folder)
+        self.assertTrue(np.shares_memory(corpus[1], corpus.tokens))
+        subset = corpus[[3,1]]
+        self.assertIs(subset.tokens, corpus.tokens)
+        self.assertEqual([piece.tolist() for piece in subset], [encodedMultiNet[3], encodedMultiNet[1]])
+        subset.save(self.folder + "/subset")
+        self.assertEqual([piece.tolist() for piece in EncodedCorpus.open(self.folder + "/subset")], [encodedMultiNet[3], encodedMultiNet[1]])
+
+
+    def test_pickle(self):
+        EncodedCorpus.fromEncoded(encodedOnOff).save(self.folder)
+        corpus = pickle.loads(pickle.dumps(EncodedCorpus.open(self.folder)))
+        self.assertIsInstance(corpus.tokens, np.memmap)
+        self.assertEqual([piece.tolist() for piece in corpus], encodedOnOff)
+
+
+    def test_datagen(self):
+        EncodedCorpus.fromEncoded(encodedMultiNet).save(self.folder)
+        np.random.seed(0)
+        datagen = DataGenEmbeddedMultiNet(encodedMultiNet, 16, 50, 3)
+        np.random.seed(0)
+        corpusDatagen = DataGenEmbeddedMultiNet(self.folder, 16, 50, 3)
+        self.assertEqual([r.tolist() for r in datagen.ranges], [r.tolist() for r in corpusDatagen.ranges])
+        np.testing.assert_array_equal(datagen.indices, corpusDatagen.indices)
+        for i in [0, len(datagen)-1]:
+            for expected, batch in zip(datagen[i], corpusDatagen[i]):
+                for e, b in zip(expected, batch):
+                    np.testing.assert_array_equal(e, b)
+
+
+    def test_windows(self):
+        corpus = EncodedCorpus.fromEncoded(encodedMultiNet)
+        starts = corpus.positions(np.array([0, 2, 2]), np.array([5, 0, 7]))
+        windows = corpus.windows(starts, 10)
+        self.assertEqual(windows.shape, (3, 10, 2))
+        self.assertEqual(windows[1].tolist(), encodedMultiNet[2][:10])
+        self.assertEqual(windows[2].tolist(), encodedMultiNet[2][7:17])
+
+
+    def test_vocabulary(self):
+        corpus = EncodedCorpus.fromEncoded(encodedMultiNet)
+        tokens = np.concatenate([np.array(piece) for piece in encodedMultiNet])
+        for chunkSize in [7, 2**20]:
+            corpus.vocabulary = None
+            vocabulary = corpus.getVocabulary(chunkSize)
+            for i in range(2):
+                values, counts = np.unique(tokens[:,i], return_counts = True)
+                np.testing.assert_array_equal(vocabulary.values[i], values)
+                np.testing.assert_array_equal(vocabulary.counts[i], counts)
+        subset = corpus[[4,0]]
+        self.assertEqual(subset.getVocabulary().counts[0].sum(), len(encodedMultiNet[4]) + len(encodedMultiNet[0]))
+        corpus.save(self.folder)
+        opened = EncodedCorpus.open(self.folder)
+        self.assertIsNotNone(opened.vocabulary)
+        np.testing.assert_array_equal(opened.vocabulary.counts[1], corpus.vocabulary.counts[1])
+        datagen = DataGenEmbeddedMultiNet(self.folder, 16, 50, 3)
+        self.assertEqual(len(datagen.frequencies[0]), len(datagen.ranges[0]))
+        self.assertEqual(datagen.frequencies[0].sum(), len(tokens))
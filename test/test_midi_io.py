@@ -0,0 +1,111 @@
+from unittest import TestCase
+import mmap
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from unittest import mock
+from midi_parser.midi_parser import MidiParser, findMidis, parseToMidos
+from midi_parser import midi_io
+from midi_parser.midi_io import openMidi, splitArchivePath, acquireArchive, releaseArchive
+from midi_parser.parse_cache import ParseCache
+
+
+folder = "test/test_data/midis"
+midiPaths = findMidis(folder)
+
+
+#Notes of parsed OneTracks, which hold notes that do not compare by value
+def asTuples(parsed):
+    return [[tuple(note) for note in track] for track in parsed]
+
+
+class TestMidiIO(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.archives = [os.path.join(self.folder, "midis.zip"), os.path.join(self.folder, "midis.tar")]
+        with zipfile.ZipFile(self.archives[0], "w") as archive:
+            for _path in midiPaths:
+                archive.write(_path, os.path.relpath(_path, folder))
+        with tarfile.open(self.archives[1], "w") as archive:
+            for _path in midiPaths:
+                archive.add(_path, os.path.relpath(_path, folder))
+
+    def tearDown(self):
+        self.assertEqual(midi_io._openArchives, {})
+        shutil.rmtree(self.folder)
+
+
+    def test_open_midi(self):
+        with openMidi(midiPaths[0]) as data:
+            self.assertIsInstance(data, mmap.mmap)
+            with open(midiPaths[0], "rb") as f:
+                self.assertEqual(data[:], f.read())
+        for archive in self.archives:
+            archiveMidis = findMidis(archive)
+            self.assertEqual(len(archiveMidis), len(midiPaths))
+            _path = os.path.join(archive, os.path.relpath(midiPaths[0], folder))
+            self.assertEqual(splitArchivePath(_path), (archive, os.path.relpath(midiPaths[0], folder)))
+            with openMidi(_path) as data, open(midiPaths[0], "rb") as f:
+                self.assertEqual(data, f.read())
+
+
+    def test_parse_archives(self):
+        expected = asTuples(MidiParser((46,84), 1/32, True, "relative", folder = folder).parse())
+        for archive in self.archives:
+            for fastReader in [False, True]:
+                mp = MidiParser((46,84), 1/32, True, "relative", folder = archive, fastReader = fastReader)
+                self.assertEqual(asTuples(mp.parse()), expected)
+            self.assertEqual(asTuples(mp.parse(workers = 2)), expected)
+
+
+    def test_midos(self):
+        for mf, archiveMf in zip(parseToMidos(midiPaths), parseToMidos(findMidis(self.archives[0]))):
+            self.assertEqual(mf.ticks_per_beat, archiveMf.ticks_per_beat)
+            self.assertEqual([len(track) for track in mf.tracks], [len(track) for track in archiveMf.tracks])
+
+
+    def test_close_archives(self):
+        mp = MidiParser((46,84), 1/32, True, "relative", folder = self.archives[0])
+        key = (self.archives[0], os.getpid())
+        self.assertNotIn(key, midi_io._openArchives)
+        parsed = mp.iter_parse()
+        next(parsed)
+        self.assertIn(key, midi_io._openArchives)
+        parsed.close()
+        self.assertNotIn(key, midi_io._openArchives)
+        acquireArchive(self.archives[0])
+        mp.parse()
+        mp.parse(workers = 2)
+        self.assertIn(key, midi_io._openArchives)
+        releaseArchive(self.archives[0])
+
+
+    def test_cached_parse_reads_once(self):
+        archive = os.path.join(self.folder, "midis.tar.gz")
+        with tarfile.open(archive, "w:gz") as f:
+            for _path in midiPaths:
+                f.add(_path, os.path.relpath(_path, folder))
+        mp = MidiParser((46,84), 1/32, True, "relative", folder = archive, cache = os.path.join(self.folder, "cache"))
+        with mock.patch.object(midi_io, "_readMember", wraps = midi_io._readMember) as readMember:
+            parsed = mp.parse()
+        self.assertEqual(readMember.call_count, len(midiPaths))
+        self.assertEqual(asTuples(mp.parse()), asTuples(parsed))
+
+
+    def test_cache_key(self):
+        cache = ParseCache(os.path.join(self.folder, "cache"))
+        settings = ((46,84), 1/32, True, "relative")
+        _path = os.path.join(self.archives[1], os.path.relpath(midiPaths[0], folder))
+        self.assertEqual(cache.key(midiPaths[0], settings), cache.key(_path, settings))
+
+
+    def test_broken_mmap(self):
+        _path = os.path.join(self.folder, "broken.mid")
+        with open(midiPaths[0], "rb") as f, open(_path, "wb") as broken:
+            broken.write(f.read()[:100])
+        for fast in [False, True]:
+            with self.assertRaises(EOFError):
+                parseToMidos(_path, fast = fast)
@@ -1,12 +1,17 @@
 import struct
+import itertools
+import types
+import pickle
 from unittest import TestCase
-from midi_parser.midi_parser import MidiParser,  OneTrack
+from midi_parser.midi_parser import MidiParser,  OneTrack, NoteArray, TimeUnitArray, DurationalNote, AbsoluteNote, parseToMidos, findMidis, mergeTracks
 import mido
 from mido import MidiFile
 
 import fluidsynth
 import time
 import os
+import shutil
+import tempfile
 import numpy as np
 from mido import MidiFile, MidiTrack, Message
 sf2 = os.path.abspath("C:/Users/noahs/Local Python Libraries/soundfonts/piano.sf2")
@@ -46,13 +51,66 @@ class TestMidiParser(TestCase):
         print(parsed)
 
 
+    def test_iter_parse(self):
+        mp = MidiParser((46,84), 1/32, True, "relative", folder = "test/test_data/midis", debugLevel = "DEBUG")
+        parsed = mp.parse()
+        iterParsed = mp.iter_parse()
+        self.assertIsInstance(iterParsed, types.GeneratorType)
+        iterParsed = list(iterParsed)
+        self.assertEqual(len(parsed), len(iterParsed))
+        for piece, iterPiece in zip(parsed, iterParsed):
+            self.assertEqual([list(note) for note in piece], [list(note) for note in iterPiece])
+
+
+    def test_parse_parallel(self):
+        mp = MidiParser((46,84), 1/32, True, "durational", folder = "test/test_data/midis", debugLevel = "DEBUG")
+        parsed = mp.parse()
+        parsedParallel = mp.parse(workers = 2)
+        self.assertEqual(len(parsed), len(parsedParallel))
+        for piece, pieceParallel in zip(parsed, parsedParallel):
+            self.assertEqual([list(note) for note in piece], [list(note) for note in pieceParallel])
+        self.assertEqual(len(mp.failedMidis), 0)
+
+
+    def test_parse_parallel_failed(self):
+        mp = MidiParser((46,84), 1/32, True, "relative", folder = "test/test_data/midis", debugLevel = "DEBUG")
+        nParsed = len(mp.parse())
+        mp.midiPaths.insert(0, "test/test_data/testlog.csv")
+        parsed = mp.parse_parallel(workers = 2, chunksize = 3)
+        self.assertEqual(len(parsed), nParsed)
+        self.assertEqual(len(mp.failedMidis), 1)
+        self.assertEqual(mp.failedMidis[0][0], "test/test_data/testlog.csv")
+
+
     def test_serialize(self):
         mp = MidiParser((46,84), 1/32, True, "relative", folder = "test/test_data/midis", debugLevel = "DEBUG")
         mp.serialize("test/test_data/serialized_relative")
     
+    def test_serialize_binary(self):
+        fp = os.path.join(tempfile.mkdtemp(), "parsed")
+        for timeMeasurement, columnar in [("relative", False), ("durational", False), ("by_time_unit", False), ("durational", True), ("by_time_unit", True)]:
+            mp = MidiParser((46,84), 1/32, True, timeMeasurement, folder = "test/test_data/midis", columnar = columnar)
+            parsed = mp.parse()
+            mp.serialize(fp, binary = True)
+            loaded = MidiParser.deSerialize(fp)
+            self.assertEqual(len(parsed), len(loaded))
+            for piece, loadedPiece in zip(parsed, loaded):
+                self.assertEqual(type(piece), type(loadedPiece))
+                if(timeMeasurement == "by_time_unit"):
+                    self.assertEqual([[list(note) for note in timeUnit] for timeUnit in piece], [[list(note) for note in timeUnit] for timeUnit in loadedPiece])
+                else:
+                    self.assertEqual([(type(note), list(note)) for note in piece], [(type(note), list(note)) for note in loadedPiece])
+        shutil.rmtree(os.path.dirname(fp))
+
     def test_deserialize(self):
         parsed = MidiParser.deSerialize("test/test_data/serialized_durational")
 
+    def test_deserialize_slotted_notes(self):
+        parsed = MidiParser.deSerialize("test/test_data/serialized_durational")
+        note = parsed[0][1]
+        self.assertFalse(hasattr(note, "__dict__"))
+        self.assertEqual(list(note), list(pickle.loads(pickle.dumps(note))))
+
     def test_play(self):
 
         parsed = MidiParser.deSerialize("test/test_data/serialized_relative")
@@ -62,6 +120,25 @@ class TestMidiParser(TestCase):
 
 
 
+#_convertDurational before it was made linear, kept as reference
+def convertDurationalQuadratic(track):
+    notesTimed = []
+    for i, note in enumerate(track):
+        if(note.time>0):
+            notesTimed.append(DurationalNote("time_unit", note.time))
+        if(note.type == "note_on"):
+            noteNum = note.pitch
+            dt = 0
+            for nextNote in track[i:]:
+                if(nextNote.type == "note_off" and nextNote.pitch == noteNum):
+                    dt+=nextNote.time 
+                    break
+                dt+=nextNote.time 
+            if(dt>0):
+                notesTimed.append(note.convertToDurational(dt))
+    return notesTimed
+
+
 class TestOneTrack(TestCase):
 
 
@@ -72,6 +149,70 @@ class TestOneTrack(TestCase):
         print("ticks per beats",ot.tpb)
 
 
+    def test_durational_regression(self):
+        for mf in parseToMidos(findMidis("test/test_data/midis")):
+            for stu in [1/32, 1/128]:
+                ot = OneTrack(mf, (46,84), stu, True, "relative")
+                if(not ot.valid):
+                    continue
+                expected = convertDurationalQuadratic(ot.track)
+                ot._convertDurational()
+                self.assertEqual([list(note) for note in expected], [list(note) for note in ot.track])
+
+
+    def test_merge_tracks(self):
+        rng = np.random.default_rng(0)
+        tracks = [[AbsoluteNote("note_on", int(time), pitch = trackInd) for time in np.sort(rng.integers(0, 50, 40))] for trackInd in range(5)]
+        merged = list(mergeTracks(iter(track) for track in tracks))
+        expected = sorted(itertools.chain.from_iterable(tracks), key = lambda note: note.time)
+        self.assertEqual([list(note) for note in expected], [list(note) for note in merged])
+
+
+    def test_note_range(self):
+        mf = MidiFile("test/test_data/midis/Bwv768 Chorale and Variations/bsgjg_c.mid")
+        for timeMeasurement in ["relative", "durational", "by_time_unit"]:
+            ot = OneTrack(mf, (55,70), 1/32, True, timeMeasurement)
+            notes = itertools.chain.from_iterable(ot.track) if timeMeasurement == "by_time_unit" else ot.track
+            for note in notes:
+                if(note.type != "time_unit"):
+                    self.assertGreaterEqual(note.pitch, 55)
+                    self.assertLessEqual(note.pitch, 70)
+                self.assertIsInstance(note.time, int)
+
+
+    def test_columnar(self):
+        mf = MidiFile("test/test_data/midis/Bwv768 Chorale and Variations/bsgjg_c.mid")
+        for timeMeasurement in ["relative", "durational"]:
+            ot = OneTrack(mf, (46,84), 1/32, True, timeMeasurement)
+            otColumnar = OneTrack(mf, (46,84), 1/32, True, timeMeasurement, columnar = True)
+            self.assertIsInstance(otColumnar.track, NoteArray)
+            self.assertEqual(len(ot.track), len(otColumnar.track))
+            self.assertEqual([list(note) for note in ot.track], [list(note) for note in otColumnar.track])
+            self.assertEqual(type(ot.track[0]), type(otColumnar.track[0]))
+
+
+    def test_time_unit_array(self):
+        mf = MidiFile("test/test_data/midis/Bwv768 Chorale and Variations/bsgjg_c.mid")
+        ot = OneTrack(mf, (46,84), 1/64, True, "by_time_unit")
+        otColumnar = OneTrack(mf, (46,84), 1/64, True, "by_time_unit", columnar = True)
+        self.assertIsInstance(otColumnar.track, TimeUnitArray)
+        self.assertEqual(len(ot.track), len(otColumnar.track))
+        self.assertEqual([[list(note) for note in timeUnit] for timeUnit in ot.track], [[list(note) for note in timeUnit] for timeUnit in otColumnar.track.toLists()])
+        nonEmpty = list(otColumnar.track.nonEmpty())
+        self.assertEqual([unit for unit, _ in nonEmpty], [i for i, timeUnit in enumerate(ot.track) if len(timeUnit) > 0])
+        self.assertEqual([list(note) for note in nonEmpty[3][1]], [list(note) for note in ot.track[nonEmpty[3][0]]])
+        fromLists = TimeUnitArray.fromLists(ot.track)
+        np.testing.assert_array_equal(fromLists.offsets, otColumnar.track.offsets)
+
+    def test_note_array(self):
+        mf = MidiFile("test/test_data/midis/Bwv768 Chorale and Variations/bsgjg_c.mid")
+        ot = OneTrack(mf, (46,84), 1/32, True, "durational")
+        noteArray = NoteArray.fromNotes(ot.track)
+        self.assertEqual([list(note) for note in ot.track], [list(note) for note in noteArray.toNotes()])
+        self.assertEqual([list(note) for note in ot.track[5:20]], [list(note) for note in noteArray[5:20]])
+        self.assertEqual(list(ot.track[-1]), list(noteArray[-1]))
+
+
 
         
     def test_play(self):
@@ -0,0 +1,99 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+from midi_parser.midi_parser import MidiParser
+from midi_parser.parse_cache import ParseCache
+
+
+bachFolder = "test/test_data/midis/Bwv768 Chorale and Variations"
+
+
+#Not recursive because the subfolder has a copy of one of the midis
+def makeParser(timeMeasurement, smallestTimeUnit, cache):
+    mp = MidiParser((46,84), smallestTimeUnit, True, timeMeasurement, cache = cache)
+    mp.queueMidis(bachFolder, r = False)
+    return mp
+
+
+class TestParseCache(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+
+    def test_hit(self):
+        cache = ParseCache(os.path.join(self.folder, "cache"))
+        mp = makeParser("relative", 1/32, cache)
+        parsed = mp.parse()
+        self.assertEqual(cache.hits, 0)
+        self.assertEqual(len(cache), len(mp.midiPaths))
+        cachedParsed = mp.parse()
+        self.assertEqual(cache.hits, len(mp.midiPaths))
+        self.assertEqual(len(parsed), len(cachedParsed))
+        for piece, cachedPiece in zip(parsed, cachedParsed):
+            self.assertEqual([list(note) for note in piece], [list(note) for note in cachedPiece])
+
+
+    def test_settings_change(self):
+        cache = ParseCache(os.path.join(self.folder, "cache"))
+        mp = makeParser("relative", 1/32, cache)
+        mp.parse()
+        makeParser("relative", 1/64, cache).parse()
+        self.assertEqual(cache.hits, 0)
+        self.assertEqual(len(cache), 2*len(mp.midiPaths))
+
+
+    def test_file_change(self):
+        midiPath = os.path.join(self.folder, "piece.mid")
+        shutil.copy(os.path.join(bachFolder, "bsgjg_c.mid"), midiPath)
+        cache = ParseCache(os.path.join(self.folder, "cache"))
+        mp = MidiParser((46,84), 1/32, True, "durational", folder = midiPath, cache = cache)
+        mp.parse()
+        shutil.copy(os.path.join(bachFolder, "bsgjg_d.mid"), midiPath)
+        changed = mp.parse()
+        self.assertEqual(cache.hits, 0)
+        expected = MidiParser((46,84), 1/32, True, "durational", folder = midiPath).parse()
+        self.assertEqual([list(note) for note in changed[0]], [list(note) for note in expected[0]])
+
+
+    def test_eviction(self):
+        cache = ParseCache(os.path.join(self.folder, "cache"))
+        makeParser("relative", 1/32, cache).parse()
+        entries = sorted(cache._entries())
+        for i, (fp, _, _) in enumerate(entries):
+            os.utime(fp, (i, i))
+        sizes = [size for _, size, _ in entries]
+        cache.maxBytes = int(sum(sizes[-3:])/ParseCache.LOW_WATER) + 1
+        cache.evict()
+        self.assertEqual(sorted(fp for fp, _, _ in cache._entries()), [fp for fp, _, _ in entries[-3:]])
+        self.assertLessEqual(cache.nBytes, cache.maxBytes*ParseCache.LOW_WATER)
+
+
+    def test_overwrite(self):
+        cache = ParseCache(os.path.join(self.folder, "cache"))
+        makeParser("relative", 1/32, cache).parse()
+        nBytes = cache.nBytes
+        cache.put("overwritten", True, [])
+        cache.put("overwritten", True, [])
+        self.assertEqual(cache.nBytes, sum(size for _, size, _ in cache._entries()))
+        self.assertGreater(cache.nBytes, nBytes)
+
+
+    def test_parallel(self):
+        mp = makeParser("relative", 1/32, os.path.join(self.folder, "cache"))
+        parsed = mp.parse(workers = 2)
+        self.assertEqual(len(mp.cache), len(mp.midiPaths))
+        cachedParsed = mp.parse()
+        self.assertEqual(mp.cache.hits, len(mp.midiPaths))
+        for piece, cachedPiece in zip(parsed, cachedParsed):
+            self.assertEqual([list(note) for note in piece], [list(note) for note in cachedPiece])
+        maxBytes = mp.cache.nBytes//2
+        mp.cache = ParseCache(os.path.join(self.folder, "bounded"), maxBytes = maxBytes)
+        mp.parse(workers = 2)
+        self.assertLessEqual(sum(size for _, size, _ in mp.cache._entries()), maxBytes)
+        self.assertEqual(mp.cache.nBytes, sum(size for _, size, _ in mp.cache._entries()))
+
@@ -0,0 +1,90 @@
+from unittest import TestCase
+import io
+import numpy as np
+from mido import MidiFile, MetaMessage
+from midi_parser.midi_parser import OneTrack, NoteArray, findMidis, parseToMidos
+from midi_parser.smf_reader import readMidiNotes
+
+
+midiPaths = findMidis("test/test_data/midis") + ["test/test_data/on_off_piece_test.mid"]
+
+
+#Note columns of each track of a mido in the order of NoteTrack
+def midoNotes(mf):
+    tracks = []
+    for track in mf.tracks:
+        notes, time = [], 0
+        for msg in track:
+            time += msg.time
+            if(not msg.is_meta and msg.type in ["note_on", "note_off"]):
+                notes.append((msg.type == "note_on", time, msg.note, msg.channel, msg.velocity))
+        tracks.append(notes)
+    return tracks
+
+def midoKey(mf):
+    keys = [msg.key for track in mf.tracks for msg in track if msg.type == "key_signature"]
+    return keys[0] if len(keys) > 0 else None
+
+
+class TestSmfReader(TestCase):
+
+    def assertConforms(self, data):
+        mf = MidiFile(file = io.BytesIO(data))
+        notes = readMidiNotes(data)
+        self.assertEqual(notes.ticks_per_beat, mf.ticks_per_beat)
+        self.assertEqual(notes.key, midoKey(mf))
+        self.assertEqual([list(zip(*[column.tolist() for column in track])) for track in notes.tracks], midoNotes(mf))
+        self.assertEqual(notes.trackNames, [next((msg.name for msg in track if msg.type == "track_name"), None) for track in mf.tracks])
+
+
+    def test_conformance(self):
+        for _path in midiPaths:
+            with open(_path, "rb") as f:
+                self.assertConforms(f.read())
+
+
+    def test_one_tracks(self):
+        for _path in midiPaths:
+            mf, notes = parseToMidos(_path)[0], parseToMidos(_path, fast = True)[0]
+            for timeMeasurement in ["relative", "durational"]:
+                expected = OneTrack(mf, (46,84), 1/32, True, timeMeasurement)
+                ot = OneTrack(notes, (46,84), 1/32, True, timeMeasurement)
+                self.assertEqual((ot.valid, ot.key, ot.name, ot.tpb), (expected.valid, expected.key, expected.name, expected.tpb))
+                if(expected.valid):
+                    self.assertEqual([tuple(note) for note in ot.track], [tuple(note) for note in expected.track])
+                    expected = OneTrack(mf, (46,84), 1/32, True, timeMeasurement, columnar = True)
+                    ot = OneTrack(notes, (46,84), 1/32, True, timeMeasurement, columnar = True)
+                    for field in NoteArray.FIELDS:
+                        np.testing.assert_array_equal(getattr(ot.track, field), getattr(expected.track, field))
+
+
+    def test_running_status(self):
+        track = bytes([
+            0x00, 0xff, 0x03, 0x04]) + b"lead" + bytes([
+            0x00, 0xff, 0x59, 0x02, 0xfd, 0x01,
+            0x00, 0xc0, 0x05,
+            0x00, 0x90, 0x3c, 0x40,
+            0x10, 0x3e, 0x40,
+            0x00, 0xf0, 0x03, 0x7e, 0x09, 0xf7,
+            0x00, 0xe0, 0x00, 0x40,
+            0x00, 0x7f, 0x7f,
+            0x81, 0x00, 0x90, 0x3c, 0x00,
+            0x00, 0xff, 0x01, 0x02]) + b"hi" + bytes([
+            0x05, 0x3e, 0x40,
+            0x00, 0x81, 0x3e, 0x00,
+            0x00, 0xff, 0x59, 0x02, 0x00, 0x00,
+            0x00, 0xff, 0x2f, 0x00])
+        data = b"MThd" + bytes([0, 0, 0, 6, 0, 1, 0, 2, 0x01, 0xe0]) + 2*(b"MTrk" + len(track).to_bytes(4, "big") + track)
+        self.assertConforms(data)
+        notes = readMidiNotes(data)
+        self.assertEqual(notes.key, "Cm")
+        self.assertEqual(notes.tracks[0].times.tolist(), [0, 16, 144, 149, 149])
+
+
+    def test_errors(self):
+        with open(midiPaths[0], "rb") as f:
+            data = f.read()
+        with self.assertRaises(OSError):
+            readMidiNotes(b"RIFF" + data[4:])
+        with self.assertRaises(EOFError):
+            readMidiNotes(data[:len(data)//2])